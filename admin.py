@@ -0,0 +1,106 @@
+import hmac
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user
+from sqlalchemy.orm import joinedload
+
+from instrumentation import instrumentation
+from login_guard import login_guard
+from metrics import platform_metrics, revenue_series, subscription_metrics
+from models import db, Pharmacy, Subscription, User
+from query_budget import query_budget
+
+admin = Blueprint('admin', __name__)
+
+
+@admin.route('/')
+@query_budget(4)
+def home():
+    if not current_user.is_authenticated or current_user.role != 'server_admin':
+        return redirect(url_for('admin.login'))
+
+    return render_template('admin/home.html',
+                         revenue_series=revenue_series(days=30),
+                         current_time=datetime.now(),
+                         **platform_metrics())
+
+
+@admin.route('/admin/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        email = request.form['email']
+        password = request.form['password']
+
+        wait = login_guard.throttle(email)
+        if wait:
+            flash(f'Demasiados intentos. Intenta de nuevo en {wait} segundos.', 'error')
+            return render_template('admin/login.html'), 429, {'Retry-After': str(wait)}
+
+        user = User.query.filter_by(email=email, role='server_admin').first()
+
+        if login_guard.verify_password(user, password):
+            login_user(user)
+            login_guard.reset(email)
+            return redirect(url_for('admin.home'))
+
+        flash('Credenciales inválidas', 'error')
+
+    return render_template('admin/login.html')
+
+
+@admin.route('/admin/pharmacies')
+@query_budget(4)
+@login_required
+def pharmacies():
+    if current_user.role != 'server_admin':
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('admin.login'))
+
+    page = request.args.get('page', 1, type=int)
+    pharmacies = (Pharmacy.query.order_by(Pharmacy.name, Pharmacy.id)
+                  .paginate(page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False))
+    return render_template('admin/pharmacies.html', pharmacies=pharmacies)
+
+
+@admin.route('/admin/pharmacy/<int:pharmacy_id>/toggle')
+@login_required
+def toggle_pharmacy_status(pharmacy_id):
+    if current_user.role != 'server_admin':
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('admin.login'))
+
+    pharmacy = Pharmacy.query.get_or_404(pharmacy_id)
+    pharmacy.is_active = not pharmacy.is_active
+    db.session.commit()
+
+    status = 'activada' if pharmacy.is_active else 'desactivada'
+    flash(f'Farmacia {status} exitosamente!', 'success')
+    return redirect(url_for('admin.pharmacies'))
+
+
+@admin.route('/admin/subscriptions')
+@query_budget(4)
+@login_required
+def subscriptions():
+    if current_user.role != 'server_admin':
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('admin.login'))
+
+    page = request.args.get('page', 1, type=int)
+    # The table shows each subscription's pharmacy; load them in the same query.
+    subscriptions = (Subscription.query.options(joinedload(Subscription.pharmacy))
+                     .order_by(Subscription.id.desc())
+                     .paginate(page=page, per_page=current_app.config['POSTS_PER_PAGE'], error_out=False))
+    return render_template('admin/subscriptions.html', subscriptions=subscriptions, **subscription_metrics())
+
+
+@admin.route('/admin/metrics')
+def metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not scraper and not (current_user.is_authenticated and current_user.role == 'server_admin'):
+        abort(403)
+
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
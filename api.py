@@ -0,0 +1,244 @@
+from flask import Blueprint, current_app, jsonify, request
+
+from cart import resolve_cart
+from catalog import InvalidCursor, filter_products, paginate_products
+from checkout import place_order
+from inventory import OutOfStock
+from models import Pharmacy, Product, Order
+from search import search_products
+from sync import catalog_changes
+from tenant_cache import tenant_cache
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+CUSTOMER_FIELDS = ('customer_name', 'customer_email', 'customer_phone', 'customer_address')
+REQUIRED_CUSTOMER_FIELDS = ('customer_name', 'customer_email', 'customer_address')
+MAX_PAGE_SIZE = 100
+
+
+def pharmacy_to_dict(pharmacy):
+    return {
+        'id': pharmacy.id,
+        'slug': pharmacy.slug,
+        'name': pharmacy.name,
+        'description': pharmacy.description,
+        'address': pharmacy.address,
+        'phone': pharmacy.phone,
+        'email': pharmacy.email,
+        'logo_url': pharmacy.logo_url,
+        'theme_color': pharmacy.theme_color,
+    }
+
+
+def product_to_dict(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': float(product.price),
+        'stock': product.stock_quantity,
+        'category': product.category,
+        'sku': product.sku,
+        'image_url': product.image_url,
+        'images': {variant: product.image_variant_url(variant) for variant in ('thumb', 'card', 'detail')}
+                  if product.image_hash else None,
+        'is_active': product.is_active,
+        'updated_at': product.updated_at.isoformat() if product.updated_at else None,
+    }
+
+
+def order_to_dict(order):
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'customer_name': order.customer_name,
+        'total_amount': float(order.total_amount),
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'items': [
+            {'product_id': item.product_id, 'quantity': item.quantity, 'price': float(item.price)}
+            for item in order.items
+        ],
+    }
+
+
+def conditional_json(payload, last_modified=None):
+    """Return ``payload`` as JSON with a strong ETag, answering 304 when it still matches.
+    
+    Clients must revalidate (``no-cache``), so an unchanged resource costs a
+    round trip with an empty body instead of a full download.
+    """
+    response = jsonify(payload)
+    response.add_etag()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def error(message, status):
+    return jsonify({'success': False, 'error': message}), status
+
+
+def get_pharmacy(slug):
+    return tenant_cache.get(slug)
+
+
+def parse_cart(data):
+    """Turn ``{"items": [{"product_id", "quantity"}]}`` into a ``{product_id: quantity}`` cart."""
+    cart = {}
+    for line in (data or {}).get('items') or []:
+        product_id = line.get('product_id') if isinstance(line, dict) else None
+        quantity = line.get('quantity', 1) if isinstance(line, dict) else None
+        if not isinstance(product_id, int) or not isinstance(quantity, int) or quantity < 1:
+            return None
+        cart[str(product_id)] = cart.get(str(product_id), 0) + quantity
+    return cart
+
+
+def cart_to_dict(cart_items, total):
+    return {
+        'items': [
+            {'product': product_to_dict(item['product']),
+             'quantity': item['quantity'],
+             'subtotal': float(item['subtotal'])}
+            for item in cart_items
+        ],
+        'total': float(total),
+    }
+
+
+@api.route('/pharmacies')
+def list_pharmacies():
+    pharmacies = Pharmacy.query.filter_by(is_active=True).order_by(Pharmacy.name, Pharmacy.id).all()
+    return conditional_json({'pharmacies': [pharmacy_to_dict(pharmacy) for pharmacy in pharmacies]})
+
+
+@api.route('/pharmacies/<slug>')
+def get_pharmacy_detail(slug):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    return conditional_json(pharmacy_to_dict(pharmacy))
+
+
+@api.route('/pharmacies/<slug>/products')
+def list_products(slug):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    
+    query = Product.query.filter_by(pharmacy_id=pharmacy.id, is_active=True)
+    
+    rank = None
+    search_query = request.args.get('search', '').strip()
+    if search_query:
+        query, rank = search_products(query, search_query)
+    
+    query = filter_products(query,
+                            category=request.args.get('category', '').strip(),
+                            max_price=request.args.get('max_price', '').strip())
+    
+    per_page = request.args.get('limit', current_app.config['POSTS_PER_PAGE'], type=int)
+    try:
+        page = paginate_products(query,
+                                 per_page=max(1, min(per_page, MAX_PAGE_SIZE)),
+                                 after=request.args.get('after'),
+                                 before=request.args.get('before'),
+                                 rank=rank)
+    except InvalidCursor:
+        return error('Cursor inválido', 400)
+    
+    # ETag only: the newest ``updated_at`` on the page says nothing about
+    # products that left it (deactivated, deleted), so Last-Modified could
+    # answer 304 for a list that changed.
+    return conditional_json({
+        'products': [product_to_dict(product) for product in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+@api.route('/pharmacies/<slug>/products/changes')
+def product_changes(slug):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    
+    limit = request.args.get('limit', current_app.config['SYNC_PAGE_SIZE'], type=int)
+    changes = catalog_changes(pharmacy.id,
+                              cursor=request.args.get('cursor'),
+                              limit=max(1, min(limit, current_app.config['SYNC_PAGE_SIZE'])),
+                              retention_days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'],
+                              overlap_seconds=current_app.config['SYNC_OVERLAP_SECONDS'])
+    changes['products'] = [product_to_dict(product) for product in changes['products']]
+    return jsonify(changes)
+
+@api.route('/pharmacies/<slug>/products/<int:product_id>')
+def get_product(slug, product_id):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    
+    product = Product.query.filter_by(id=product_id, pharmacy_id=pharmacy.id, is_active=True).first()
+    if product is None:
+        return error('Producto no encontrado', 404)
+    return conditional_json(product_to_dict(product), last_modified=product.updated_at)
+
+
+@api.route('/pharmacies/<slug>/cart', methods=['POST'])
+def price_cart(slug):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    
+    cart = parse_cart(request.get_json(silent=True))
+    if cart is None:
+        return error('Carrito inválido', 400)
+    
+    return jsonify(cart_to_dict(*resolve_cart(pharmacy, cart)))
+
+
+@api.route('/pharmacies/<slug>/orders', methods=['POST'])
+def create_order(slug):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    
+    data = request.get_json(silent=True) or {}
+    cart = parse_cart(data)
+    if cart is None:
+        return error('Carrito inválido', 400)
+    
+    missing = [field for field in REQUIRED_CUSTOMER_FIELDS if not data.get(field)]
+    if missing:
+        return error(f'Campos requeridos: {", ".join(missing)}', 400)
+    
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= 64:
+        return error('Idempotency-Key inválida', 400)
+    
+    cart_items, _ = resolve_cart(pharmacy, cart)
+    if not cart_items:
+        return error('El carrito está vacío', 400)
+    
+    try:
+        order, created = place_order(pharmacy, {field: data.get(field) for field in CUSTOMER_FIELDS}, cart_items,
+                                     idempotency_key=idempotency_key)
+    except OutOfStock as e:
+        return jsonify({'success': False, 'error': str(e),
+                        'out_of_stock': [product.id for product in e.products]}), 409
+    return jsonify(order_to_dict(order)), 201 if created else 200
+
+
+@api.route('/pharmacies/<slug>/orders/<order_number>')
+def get_order(slug, order_number):
+    pharmacy = get_pharmacy(slug)
+    if pharmacy is None:
+        return error('Farmacia no encontrada', 404)
+    
+    order = Order.query.filter_by(order_number=order_number, pharmacy_id=pharmacy.id).first()
+    if order is None:
+        return error('Pedido no encontrado', 404)
+    return conditional_json(order_to_dict(order), last_modified=order.updated_at)
@@ -1,10 +1,63 @@
 import flet as ft
 import requests
 import json
+import os
+import threading
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+from cache_local import CatalogoLocal
 
 # Configuración básica - deberías cambiar esto según tu API
-API_BASE_URL = "http://tu-api-dimafarm.com/api"
+API_BASE_URL = "http://tu-api-dimafarm.com/api/v1"
+API_TIMEOUT = 10  # segundos
+
+# Caché local: se muestra al instante y se revalida en segundo plano cuando
+# tiene más de CACHE_MAX_AGE segundos.
+CACHE_PATH = os.path.join(os.getenv("FLET_APP_STORAGE_DATA", os.path.dirname(os.path.abspath(__file__))),
+                          "dimafarm_cache.db")
+CACHE_MAX_AGE = 300
+PRODUCTS_PAGE_SIZE = 40
+
+# Una sola sesión HTTP para reutilizar conexiones keep-alive con la API
+http = requests.Session()
+http.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip"})
+http.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=2))
+http.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=2))
+
+catalog = CatalogoLocal(CACHE_PATH)
+
+
+def refresh_pharmacies():
+    """Revalida la lista de farmacias con If-None-Match. Devuelve True si cambió."""
+    _, etag, _ = catalog.state("pharmacies")
+    response = http.get(f"{API_BASE_URL}/pharmacies",
+                        headers={"If-None-Match": etag} if etag else {},
+                        timeout=API_TIMEOUT)
+    if response.status_code == 304:
+        catalog.touch("pharmacies")
+        return False
+    response.raise_for_status()
+    catalog.save_pharmacies(response.json()["pharmacies"], response.headers.get("ETag"))
+    return True
+
+
+def sync_products(pharmacy):
+    """Descarga solo los cambios del catálogo desde el último cursor. Devuelve True si hubo cambios."""
+    key = f"products:{pharmacy['id']}"
+    cursor, _, _ = catalog.state(key)
+    changed = False
+    while True:
+        response = http.get(f"{API_BASE_URL}/pharmacies/{pharmacy['slug']}/products/changes",
+                            params={"cursor": cursor} if cursor else {},
+                            timeout=API_TIMEOUT)
+        response.raise_for_status()
+        changes = response.json()
+        catalog.apply_changes(pharmacy["id"], changes)
+        changed = changed or changes["reset"] or bool(changes["products"] or changes["deleted"])
+        cursor = changes["next_cursor"]
+        if not changes["has_more"]:
+            return changed
 
 def main(page: ft.Page):
     page.title = "Dimafarm"
@@ -15,7 +68,9 @@ def main(page: ft.Page):
     # Variables de estado
     current_user = None
     current_pharmacy = None
+    current_view = None
     cart_items = []
+    refreshing = set()
     
     # Funciones de API (simuladas para el ejemplo)
     def login_user(email, password):
@@ -25,19 +80,29 @@ def main(page: ft.Page):
         return {"success": False, "message": "Credenciales incorrectas"}
     
     def get_pharmacies():
-        # Simulación de respuesta
-        return [
-            {"id": 1, "name": "Farmacia Central", "color": "#4CAF50", "logo": "🏥"},
-            {"id": 2, "name": "Farmacia del Pueblo", "color": "#2196F3", "logo": "💊"},
-        ]
-    
-    def get_products(pharmacy_id):
-        # Simulación de respuesta
-        return [
-            {"id": 1, "name": "Paracetamol", "price": 5.99, "description": "Alivia el dolor y la fiebre", "image": "💊", "stock": 50},
-            {"id": 2, "name": "Ibuprofeno", "price": 7.50, "description": "Antiinflamatorio y analgésico", "image": "💊", "stock": 30},
-            {"id": 3, "name": "Vitamina C", "price": 12.99, "description": "Suplemento vitamínico", "image": "🍊", "stock": 20},
-        ]
+        return catalog.pharmacies()
+    
+    def get_products(pharmacy_id, offset=0, limit=PRODUCTS_PAGE_SIZE):
+        return catalog.products(pharmacy_id, offset, limit)
+    
+    def revalidate(key, refresh, view):
+        """Stale-while-revalidate: refresca en segundo plano y redibuja la vista si sigue abierta."""
+        if key in refreshing or not catalog.is_stale(key, CACHE_MAX_AGE):
+            return
+        refreshing.add(key)
+        
+        def worker():
+            try:
+                changed = refresh()
+            except (requests.RequestException, ValueError, KeyError):
+                return  # Sin conexión: seguimos mostrando la caché
+            finally:
+                refreshing.discard(key)
+            if changed and current_view == view:
+                page.clean()
+                view()
+        
+        threading.Thread(target=worker, daemon=True).start()
     
     # Funciones de navegación
     def go_login(e):
@@ -67,6 +132,8 @@ def main(page: ft.Page):
     
     # Vistas de la aplicación
     def render_login():
+        nonlocal current_view
+        current_view = render_login
         email_field = ft.TextField(label="Email", width=300)
         password_field = ft.TextField(label="Contraseña", password=True, width=300)
         
@@ -94,7 +161,10 @@ def main(page: ft.Page):
         page.add(login_form)
     
     def render_pharmacy_selection():
+        nonlocal current_view
+        current_view = render_pharmacy_selection
         pharmacies = get_pharmacies()
+        revalidate("pharmacies", refresh_pharmacies, render_pharmacy_selection)
         pharmacy_cards = []
         
         for pharmacy in pharmacies:
@@ -102,7 +172,7 @@ def main(page: ft.Page):
                 content=ft.Container(
                     content=ft.Column([
                         ft.ListTile(
-                            leading=ft.Text(pharmacy["logo"], size=24),
+                            leading=ft.Icon(ft.Icons.LOCAL_PHARMACY, color=pharmacy.get("theme_color")),
                             title=ft.Text(pharmacy["name"]),
                         ),
                         ft.Row([
@@ -116,35 +186,58 @@ def main(page: ft.Page):
             )
             pharmacy_cards.append(card)
         
+        if not pharmacy_cards:
+            pharmacy_cards.append(ft.Text("Cargando farmacias...", color=ft.Colors.GREY))
+        
         page.add(ft.Column([
             ft.Text("Selecciona una farmacia", size=20, weight=ft.FontWeight.BOLD),
             ft.Container(height=20),
         ] + pharmacy_cards))
     
+    def build_product_card(product):
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.ListTile(
+                        leading=ft.Icon(ft.Icons.MEDICATION),
+                        title=ft.Text(product["name"]),
+                        subtitle=ft.Text(f"${product['price']} - {product['description'] or ''}"),
+                    ),
+                    ft.Row([
+                        ft.Text(f"Stock: {product['stock']}", size=12, color=ft.Colors.GREY),
+                        ft.TextButton("Agregar al carrito", 
+                                     on_click=lambda e, p=product: add_to_cart(e, p))
+                    ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                ]),
+                width=400,
+                padding=10,
+            )
+        )
+    
     def render_product_list():
-        products = get_products(current_pharmacy["id"])
-        product_cards = []
+        nonlocal current_view
+        current_view = render_product_list
+        pharmacy = current_pharmacy
+        revalidate(f"products:{pharmacy['id']}", lambda: sync_products(pharmacy), render_product_list)
         
-        for product in products:
-            card = ft.Card(
-                content=ft.Container(
-                    content=ft.Column([
-                        ft.ListTile(
-                            leading=ft.Text(product["image"], size=24),
-                            title=ft.Text(product["name"]),
-                            subtitle=ft.Text(f"${product['price']} - {product['description']}"),
-                        ),
-                        ft.Row([
-                            ft.Text(f"Stock: {product['stock']}", size=12, color=ft.Colors.GREY),
-                            ft.TextButton("Agregar al carrito", 
-                                         on_click=lambda e, p=product: add_to_cart(e, p))
-                        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                    ]),
-                    width=400,
-                    padding=10,
-                )
-            )
-            product_cards.append(card)
+        # Las tarjetas se construyen por tramos a medida que el usuario hace scroll
+        product_list = ft.ListView(expand=True, spacing=5, on_scroll_interval=100)
+        loaded = 0
+        
+        def load_more():
+            nonlocal loaded
+            batch = get_products(pharmacy["id"], loaded)
+            product_list.controls.extend(build_product_card(product) for product in batch)
+            loaded += len(batch)
+            return bool(batch)
+        
+        def on_scroll(e):
+            if e.max_scroll_extent and e.pixels >= e.max_scroll_extent - 400 and load_more():
+                product_list.update()
+        
+        product_list.on_scroll = on_scroll
+        if not load_more():
+            product_list.controls.append(ft.Text("Cargando productos...", color=ft.Colors.GREY))
         
         cart_badge = ft.Badge(
             content=ft.IconButton(icon=ft.Icons.SHOPPING_CART, on_click=go_cart),
@@ -155,15 +248,15 @@ def main(page: ft.Page):
             cart_badge.value = len(cart_items)
         
         page.appbar = ft.AppBar(
-            title=ft.Text(current_pharmacy["name"]),
-            bgcolor=current_pharmacy["color"],
+            title=ft.Text(pharmacy["name"]),
+            bgcolor=pharmacy.get("theme_color"),
             actions=[cart_badge]
         )
         
-        page.add(ft.Column([
+        page.add(
             ft.Text("Productos disponibles", size=20, weight=ft.FontWeight.BOLD),
-            ft.Container(height=20),
-        ] + product_cards))
+            product_list,
+        )
     
     def add_to_cart(e, product):
         cart_items.append(product)
@@ -172,6 +265,8 @@ def main(page: ft.Page):
         page.update()
     
     def render_cart():
+        nonlocal current_view
+        current_view = render_cart
         if not cart_items:
             page.add(ft.Column([
                 ft.Text("Tu carrito está vacío", size=20),
@@ -204,7 +299,7 @@ def main(page: ft.Page):
         
         page.appbar = ft.AppBar(
             title=ft.Text("Mi Carrito"),
-            bgcolor=current_pharmacy["color"],
+            bgcolor=current_pharmacy.get("theme_color"),
         )
         
         page.add(ft.Column(cart_list))
@@ -0,0 +1,99 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class CatalogoLocal:
+    """Caché SQLite local de farmacias y productos, por id de farmacia.
+
+    Guarda el cursor de sincronización de cada farmacia para pedir al
+    servidor solo los cambios desde la última vez.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pharmacy (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS product (
+                    pharmacy_id INTEGER NOT NULL,
+                    id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    is_active INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (pharmacy_id, id)
+                );
+                CREATE INDEX IF NOT EXISTS ix_product_listing ON product (pharmacy_id, is_active, name, id);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    cursor TEXT,
+                    etag TEXT,
+                    synced_at REAL NOT NULL
+                );
+            """)
+
+    # Farmacias
+
+    def pharmacies(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM pharmacy ORDER BY id").fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def save_pharmacies(self, pharmacies, etag=None):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pharmacy")
+            self._conn.executemany("INSERT INTO pharmacy (id, data) VALUES (?, ?)",
+                                   [(p["id"], json.dumps(p)) for p in pharmacies])
+            self._save_state("pharmacies", None, etag)
+
+    # Productos
+
+    def products(self, pharmacy_id, offset=0, limit=50):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM product WHERE pharmacy_id = ? AND is_active = 1 "
+                "ORDER BY name, id LIMIT ? OFFSET ?",
+                (pharmacy_id, limit, offset),
+            ).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def apply_changes(self, pharmacy_id, changes):
+        """Aplica una página de /products/changes en una sola transacción."""
+        with self._lock, self._conn:
+            if changes.get("reset"):
+                self._conn.execute("DELETE FROM product WHERE pharmacy_id = ?", (pharmacy_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO product (pharmacy_id, id, name, is_active, data) VALUES (?, ?, ?, ?, ?)",
+                [(pharmacy_id, p["id"], p["name"], 1 if p["is_active"] else 0, json.dumps(p))
+                 for p in changes["products"]],
+            )
+            self._conn.executemany("DELETE FROM product WHERE pharmacy_id = ? AND id = ?",
+                                   [(pharmacy_id, product_id) for product_id in changes["deleted"]])
+            self._save_state(f"products:{pharmacy_id}", changes["next_cursor"], None)
+
+    # Estado de sincronización
+
+    def state(self, key):
+        """Devuelve ``(cursor, etag, synced_at)`` o ``(None, None, 0)``."""
+        with self._lock:
+            row = self._conn.execute("SELECT cursor, etag, synced_at FROM sync_state WHERE key = ?",
+                                     (key,)).fetchone()
+        return row or (None, None, 0)
+
+    def touch(self, key):
+        """Marca ``key`` como recién validado sin cambiar su cursor ni su ETag."""
+        cursor, etag, _ = self.state(key)
+        with self._lock, self._conn:
+            self._save_state(key, cursor, etag)
+
+    def is_stale(self, key, max_age):
+        return time.time() - self.state(key)[2] > max_age
+
+    def _save_state(self, key, cursor, etag):
+        self._conn.execute("INSERT OR REPLACE INTO sync_state (key, cursor, etag, synced_at) VALUES (?, ?, ?, ?)",
+                           (key, cursor, etag, time.time()))
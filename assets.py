@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_MAX_AGE = 31536000  # one year
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class AssetManifest:
+    """Map of source asset names (``css/style.css``) to fingerprinted copies.
+
+    The manifest is written by ``flask build-assets``. Fingerprinted files
+    never change once published, so they are served with far-future
+    ``immutable`` caching; editing the source changes the URL instead.
+    """
+
+    def __init__(self):
+        self._entries = None
+
+    def init_app(self, app):
+        app.extensions['asset_manifest'] = self
+        app.jinja_env.globals['asset_url'] = self.url
+        app.view_functions['static'] = send_static
+        app.cli.command('build-assets')(build_assets_command)
+
+    def url(self, filename):
+        """``url_for('static')`` of the fingerprinted copy of ``filename`` when built."""
+        if not current_app.debug:
+            if self._entries is None:
+                self._entries = self._load()
+            filename = self._entries.get(filename, filename)
+        return url_for('static', filename=filename)
+
+    def _load(self):
+        path = os.path.join(current_app.static_folder, DIST_FOLDER, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+asset_manifest = AssetManifest()
+
+
+def build_assets(static_folder, sources=('css', 'js')):
+    """Copy ``sources`` under ``dist/`` with a content hash in the name.
+
+    Writes gzip (and brotli, when installed) variants next to each copy and
+    returns the manifest.
+    """
+    dist = os.path.join(static_folder, DIST_FOLDER)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for source in sources:
+        for root, _, files in os.walk(os.path.join(static_folder, source)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                logical = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                stem, ext = os.path.splitext(logical)
+                fingerprinted = f'{DIST_FOLDER}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+                target = os.path.join(static_folder, fingerprinted)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(path, target)
+                precompress(target, data)
+                manifest[logical] = fingerprinted
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def precompress(path, data=None):
+    """Write ``.gz`` and ``.br`` siblings of ``path`` if its type compresses well."""
+    if os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+        return
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    with open(f'{path}.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(f'{path}.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_assets_command():
+    """Genera los archivos estáticos versionados y comprimidos en static/dist."""
+    manifest = build_assets(current_app.static_folder)
+    print(f'Archivos generados: {len(manifest)}.')
+
+
+def is_immutable(filename):
+    """True for files whose name contains the hash of their content."""
+    return filename.startswith(f'{DIST_FOLDER}/') or filename.startswith('uploads/products/')
+
+
+def send_static(filename):
+    """Serve a file of the static folder, replacing Flask's default view.
+
+    Content-addressed files get ``Cache-Control: immutable``. A precompressed
+    ``.br``/``.gz`` sibling is sent when the client accepts it. With
+    ``X_ACCEL_REDIRECT_PREFIX`` set, nginx is told to send the file itself
+    (enable ``gzip_static`` on that location); ``USE_X_SENDFILE`` does the
+    same for Apache/lighttpd through Flask.
+    """
+    static_folder = current_app.static_folder
+    path = safe_join(static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    max_age = IMMUTABLE_MAX_AGE if is_immutable(filename) else None
+
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = current_app.response_class(mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + filename
+        return _cache_headers(response, max_age)
+
+    compressible = os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS
+    if compressible:
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+                response = send_from_directory(static_folder, filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0],
+                                               max_age=max_age)
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return _cache_headers(response, max_age)
+
+    response = send_from_directory(static_folder, filename, max_age=max_age)
+    if compressible:
+        response.vary.add('Accept-Encoding')
+    return _cache_headers(response, max_age)
+
+
+def _cache_headers(response, max_age):
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    return response
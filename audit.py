@@ -0,0 +1,244 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import has_request_context, request, session as flask_session
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, AuditLog, Category, Order, Pharmacy, Product, Subscription, User
+
+logger = logging.getLogger(__name__)
+
+audit_table = AuditLog.__table__
+AUDITED_MODELS = (Pharmacy, Product, Order, Subscription, Category, User)
+IGNORED_COLUMNS = {'password_hash', 'created_at', 'updated_at'}
+
+
+class AuditWriter:
+    """Buffers ``AuditLog`` rows in memory and writes them in bulk.
+
+    Entries are captured from committed ORM changes (see the session
+    listeners below) and written with one multi-row ``INSERT`` once
+    ``AUDIT_FLUSH_SIZE`` of them are waiting or ``AUDIT_FLUSH_INTERVAL``
+    seconds have passed, by a background thread or, with
+    ``AUDIT_BACKGROUND_FLUSH`` off, at the end of the request that crosses
+    the threshold. The buffer is flushed again at interpreter exit.
+
+    What a crash can lose is bounded: at most one interval's worth of
+    entries under normal load, and never more than ``AUDIT_MAX_BUFFER`` (the
+    oldest are dropped and logged once the buffer is full, e.g. while the
+    database is unreachable).
+    """
+
+    def __init__(self, flush_size=100, flush_interval=5.0, max_buffer=10000):
+        self.app = None
+        self.enabled = True
+        self.background = True
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._last_flush = time.monotonic()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ENABLED', self.enabled)
+        self.background = app.config.get('AUDIT_BACKGROUND_FLUSH', self.background)
+        self.flush_size = app.config.get('AUDIT_FLUSH_SIZE', self.flush_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+        self.max_buffer = app.config.get('AUDIT_MAX_BUFFER', self.max_buffer)
+        app.extensions['audit_writer'] = self
+        app.teardown_appcontext(self._flush_if_due)
+        atexit.register(self.close)
+
+    def append(self, entries):
+        with self._lock:
+            for entry in entries:
+                if len(self._buffer) >= self.max_buffer:
+                    self._buffer.popleft()
+                    self.dropped += 1
+                self._buffer.append(entry)
+            pending = len(self._buffer)
+        if self.background:
+            self._ensure_thread()
+            if pending >= self.flush_size:
+                self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered; returns the number of rows written.
+
+        On a database error the rows go back to the front of the buffer
+        (within ``AUDIT_MAX_BUFFER``) and are retried on the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+                self._last_flush = time.monotonic()
+            if not rows:
+                return 0
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(insert(audit_table), rows)
+            except (IntegrityError, DataError):
+                # A bad row (e.g. a user deleted since) must not hold back the batch.
+                return self._write_one_by_one(rows)
+            except Exception:
+                logger.exception('Could not write %d audit entries', len(rows))
+                with self._lock:
+                    room = max(self.max_buffer - len(self._buffer), 0)
+                    self.dropped += max(len(rows) - room, 0)
+                    if room:
+                        self._buffer.extendleft(reversed(rows[-room:]))
+                return 0
+            return len(rows)
+
+    def _write_one_by_one(self, rows):
+        written = 0
+        with self.app.app_context():
+            for row in rows:
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(insert(audit_table), [row])
+                    written += 1
+                except (IntegrityError, DataError):
+                    logger.exception('Dropping audit entry %s %s:%s', row['action'], row['table_name'], row['record_id'])
+                    self.dropped += 1
+        return written
+
+    def close(self):
+        """Stop the flush thread and write what is left; registered with ``atexit``."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self.app is not None:
+            self.flush()
+        if self.dropped:
+            logger.warning('%d audit entries were dropped because the buffer was full', self.dropped)
+
+    def _due(self):
+        with self._lock:
+            pending = len(self._buffer)
+        return pending and (pending >= self.flush_size or
+                            time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def _flush_if_due(self, exception=None):
+        # flush() pushes an app context of its own; its teardown must not flush again.
+        if not self.background and not self._flush_lock.locked() and self._due():
+            self.flush()
+
+    def _ensure_thread(self):
+        # Started lazily so that each worker forked from a preloaded app gets its own thread.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            if self._due():
+                self.flush()
+
+
+audit_writer = AuditWriter()
+
+
+def _values(state, keys):
+    return json.dumps({key: state.dict.get(key) for key in keys}, default=str, sort_keys=True)
+
+
+def _entry(action, state, old_values=None, new_values=None):
+    entry = {
+        'action': action,
+        'table_name': state.mapper.local_table.name,
+        'record_id': state.identity[0] if state.identity else state.dict.get('id'),
+        'old_values': old_values,
+        'new_values': new_values,
+        'user_id': None,
+        'ip_address': None,
+        'user_agent': None,
+        'created_at': datetime.utcnow(),
+    }
+    if has_request_context():
+        # The id Flask-Login keeps in the session: reading current_user here
+        # could load the user in the middle of a flush.
+        user_id = flask_session.get('_user_id')
+        entry['user_id'] = int(user_id) if user_id and str(user_id).isdigit() else None
+        entry['ip_address'] = (request.remote_addr or '')[:45] or None
+        entry['user_agent'] = (request.user_agent.string or '')[:255] or None
+    return entry
+
+
+def _capture(session, flush_context):
+    if not audit_writer.enabled:
+        return
+    entries = session.info.setdefault('audit_entries', [])
+    for obj in session.new:
+        if isinstance(obj, AUDITED_MODELS):
+            state = inspect(obj)
+            keys = [attr.key for attr in state.mapper.column_attrs if attr.key not in IGNORED_COLUMNS]
+            entries.append(_entry('create', state, new_values=_values(state, keys)))
+    for obj in session.dirty:
+        if isinstance(obj, AUDITED_MODELS):
+            state = inspect(obj)
+            old_values, new_values = {}, {}
+            for attr in state.mapper.column_attrs:
+                if attr.key in IGNORED_COLUMNS:
+                    continue
+                history = state.attrs[attr.key].history
+                if history.has_changes():
+                    old_values[attr.key] = history.deleted[0] if history.deleted else None
+                    new_values[attr.key] = history.added[0] if history.added else None
+            if new_values:
+                entries.append(_entry('update', state,
+                                      old_values=json.dumps(old_values, default=str, sort_keys=True),
+                                      new_values=json.dumps(new_values, default=str, sort_keys=True)))
+    for obj in session.deleted:
+        if isinstance(obj, AUDITED_MODELS):
+            state = inspect(obj)
+            # Only the loaded values: loading expired ones would query mid-flush.
+            keys = [attr.key for attr in state.mapper.column_attrs
+                    if attr.key not in IGNORED_COLUMNS and attr.key in state.dict]
+            entries.append(_entry('delete', state, old_values=_values(state, keys)))
+
+
+def _commit_entries(session):
+    entries = session.info.pop('audit_entries', None)
+    if entries:
+        audit_writer.append(entries)
+
+
+def _discard_entries(session):
+    session.info.pop('audit_entries', None)
+
+
+# Entries are captured at flush time, when the old and new values are known,
+# and only handed to the writer once the commit lands.
+event.listen(Session, 'after_flush', _capture)
+event.listen(Session, 'after_commit', _commit_entries)
+event.listen(Session, 'after_rollback', _discard_entries)
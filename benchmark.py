@@ -0,0 +1,383 @@
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, insert, select
+from werkzeug.security import generate_password_hash
+
+from metrics import metrics_cache, rebuild_daily_metrics
+from models import db, User, Pharmacy, Product, Order, OrderItem, InventoryMovement, Subscription
+from order_stats import rebuild_order_stats
+
+BENCH_PASSWORD = 'bench'
+BATCH = 1000
+
+DRUGS = ('Paracetamol', 'Ibuprofeno', 'Amoxicilina', 'Omeprazol', 'Loratadina', 'Metformina', 'Losartán',
+         'Atorvastatina', 'Diclofenaco', 'Naproxeno', 'Cetirizina', 'Salbutamol', 'Azitromicina', 'Ranitidina',
+         'Clonazepam', 'Sertralina', 'Enalapril', 'Ácido fólico', 'Vitamina C', 'Vitamina D3', 'Complejo B',
+         'Dexametasona', 'Ketorolaco', 'Metronidazol', 'Fluconazol', 'Levotiroxina', 'Aspirina', 'Simvastatina')
+FORMS = ('tabletas', 'cápsulas', 'jarabe', 'suspensión', 'crema', 'gotas', 'inyectable', 'sobres')
+DOSES = ('5 mg', '10 mg', '20 mg', '50 mg', '100 mg', '250 mg', '500 mg', '1 g')
+# Category name and relative share of the catalog.
+CATEGORIES = (('Analgésicos', 20), ('Antibióticos', 12), ('Vitaminas', 14), ('Antialérgicos', 8),
+              ('Gastrointestinal', 10), ('Cardiovascular', 9), ('Dermatología', 7), ('Respiratorio', 6),
+              ('Cuidado personal', 10), ('Bebés', 4))
+# Order status and its share of historical orders.
+ORDER_STATUSES = (('delivered', 62), ('shipped', 8), ('processing', 5), ('confirmed', 7),
+                  ('pending', 12), ('cancelled', 6))
+CITIES = ('Caracas', 'Valencia', 'Maracaibo', 'Barquisimeto', 'Mérida', 'Puerto La Cruz')
+SEARCH_TERMS = ('paracetamol', 'ibuprofeno 400', 'vitamina', 'jarabe', 'amoxicilina cápsulas', 'crema', 'omeprazol')
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def seed_bench(pharmacies=5, products=500, orders=2000, days=180, seed=42, prefix='bench'):
+    """Bulk insert a synthetic multi-tenant dataset; returns the row counts.
+
+    Everything is derived from ``seed``, so two runs with the same
+    arguments produce the same catalog and order history. Prices are
+    log-normal, product popularity follows a Zipf law and orders come in
+    more often on weekdays; every order item has its ``out`` inventory
+    movement, after an initial ``in`` per product, so stock and ledger agree.
+    Rows are written with Core ``INSERT`` statements in batches of
+    ``BATCH``, which bypass the mapper events, so the daily metrics and the
+    per-pharmacy order totals are rebuilt at the end.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    password_hash = generate_password_hash(BENCH_PASSWORD, method=current_app.config['PASSWORD_HASH_METHOD'])
+    counts = {'pharmacies': 0, 'products': 0, 'orders': 0, 'order_items': 0, 'inventory_movements': 0}
+
+    if db.session.execute(select(func.count()).select_from(User.__table__)
+                          .where(User.email == f'admin@{prefix}.test')).scalar():
+        raise ValueError(f'Ya existen datos de benchmark con el prefijo {prefix!r}')
+    db.session.execute(insert(User.__table__).values(
+        name='Benchmark', email=f'admin@{prefix}.test', password_hash=password_hash,
+        role='server_admin', is_active=True, created_at=now))
+
+    for number in range(1, pharmacies + 1):
+        slug = f'{prefix}-{number:03d}'
+        admin_id = db.session.execute(insert(User.__table__).values(
+            name=f'Admin {slug}', email=f'admin@{slug}.test', password_hash=password_hash,
+            role='pharmacy_admin', is_active=True, created_at=now)).inserted_primary_key[0]
+        pharmacy_id = db.session.execute(insert(Pharmacy.__table__).values(
+            name=f'Farmacia {prefix.title()} {number:03d}', slug=slug, address=f'Av. Principal {number}, {rng.choice(CITIES)}',
+            description='Farmacia generada para pruebas de rendimiento.', theme_color='#007bff', is_active=True,
+            admin_user_id=admin_id, created_at=now - timedelta(days=days))).inserted_primary_key[0]
+        db.session.execute(insert(Subscription.__table__).values(
+            pharmacy_id=pharmacy_id, plan_type=rng.choice(('monthly', 'yearly')), amount=Decimal('99.99'),
+            status=_weighted(rng, (('active', 80), ('pending', 10), ('expired', 10))),
+            start_date=now - timedelta(days=days), created_at=now - timedelta(days=days)))
+        counts['pharmacies'] += 1
+
+        catalog = _seed_products(rng, pharmacy_id, products, now - timedelta(days=days))
+        counts['products'] += len(catalog)
+        _seed_orders(rng, pharmacy_id, prefix, catalog, orders, days, now, counts)
+        db.session.commit()
+
+    rebuild_daily_metrics()
+    rebuild_order_stats()
+    metrics_cache.clear()
+    return counts
+
+
+def _seed_products(rng, pharmacy_id, count, created_at):
+    rows = []
+    for number in range(count):
+        drug = DRUGS[number % len(DRUGS)]
+        name = f'{drug} {rng.choice(DOSES)} {rng.choice(FORMS)}'
+        price = Decimal(str(round(min(max(rng.lognormvariate(2.1, 0.8), 0.5), 500), 2)))
+        stock = 0 if rng.random() < 0.05 else int(rng.expovariate(1 / 80)) + 1
+        rows.append({'name': name[:100], 'description': f'{drug} en presentación de {name.split()[-1]}.',
+                     'price': price, 'stock_quantity': stock, 'category': _weighted(rng, CATEGORIES),
+                     'sku': f'B{pharmacy_id:04d}-{number:06d}', 'is_active': rng.random() > 0.03,
+                     'pharmacy_id': pharmacy_id, 'created_at': created_at, 'updated_at': created_at})
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(insert(Product.__table__), rows[start:start + BATCH])
+    return list(db.session.execute(
+        select(Product.id, Product.price, Product.stock_quantity)
+        .where(Product.pharmacy_id == pharmacy_id).order_by(Product.id)))
+
+
+def _seed_orders(rng, pharmacy_id, prefix, catalog, count, days, now, counts):
+    # Zipf popularity: a few products sell much more than the long tail.
+    popularity = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(catalog))))
+    shuffled = catalog[:]
+    rng.shuffle(shuffled)
+
+    dates = []
+    while len(dates) < count:
+        created_at = now - timedelta(seconds=rng.randrange(days * 86400))
+        if created_at.weekday() < 5 or rng.random() < 0.6:
+            dates.append(created_at)
+    dates.sort()
+
+    orders, lines = [], []
+    sold = {}
+    for number, created_at in enumerate(dates):
+        quantities, products = {}, {}
+        for _ in range(min(1 + int(rng.expovariate(0.6)), 8)):
+            product = rng.choices(shuffled, cum_weights=popularity)[0]
+            quantities[product.id] = quantities.get(product.id, 0) + rng.choice((1, 1, 1, 2, 3))
+            products[product.id] = product
+        picks = [(products[product_id], quantity) for product_id, quantity in quantities.items()]
+        status = _weighted(rng, ORDER_STATUSES)
+        order_number = f'{prefix.upper()[:6]}{pharmacy_id:04d}-{number:06d}'
+        orders.append({'order_number': order_number, 'customer_name': f'Cliente {rng.randrange(1, count // 3 + 2)}',
+                       'customer_email': f'cliente{rng.randrange(1, count // 3 + 2)}@example.test',
+                       'customer_address': f'Calle {rng.randrange(1, 200)}, {rng.choice(CITIES)}',
+                       'total_amount': sum(product.price * quantity for product, quantity in picks),
+                       'status': status,
+                       'payment_status': 'refunded' if status == 'cancelled' else
+                                         'pending' if status == 'pending' else 'paid',
+                       'pharmacy_id': pharmacy_id, 'created_at': created_at, 'updated_at': created_at})
+        lines.append((order_number, created_at, picks))
+        for product, quantity in picks:
+            sold[product.id] = sold.get(product.id, 0) + quantity
+
+    for start in range(0, len(orders), BATCH):
+        db.session.execute(insert(Order.__table__), orders[start:start + BATCH])
+    order_ids = dict(db.session.execute(
+        select(Order.order_number, Order.id).where(Order.pharmacy_id == pharmacy_id)).all())
+
+    # Opening stock covers everything sold since, so the ledger ends at the current stock.
+    stock = {product.id: product.stock_quantity + sold.get(product.id, 0) for product in catalog}
+    opened_at = now - timedelta(days=days)
+    movements = [{'product_id': product_id, 'movement_type': 'in', 'quantity': quantity, 'previous_stock': 0,
+                  'new_stock': quantity, 'reason': 'Inventario inicial', 'reference': None, 'created_at': opened_at}
+                 for product_id, quantity in stock.items()]
+    items = []
+    for order_number, created_at, picks in lines:
+        for product, quantity in picks:
+            items.append({'order_id': order_ids[order_number], 'product_id': product.id,
+                          'quantity': quantity, 'price': product.price})
+            movements.append({'product_id': product.id, 'movement_type': 'out', 'quantity': quantity,
+                              'previous_stock': stock[product.id], 'new_stock': stock[product.id] - quantity,
+                              'reason': 'Venta', 'reference': order_number, 'created_at': created_at})
+            stock[product.id] -= quantity
+
+    for start in range(0, len(items), BATCH):
+        db.session.execute(insert(OrderItem.__table__), items[start:start + BATCH])
+    for start in range(0, len(movements), BATCH):
+        db.session.execute(insert(InventoryMovement.__table__), movements[start:start + BATCH])
+    counts['orders'] += len(orders)
+    counts['order_items'] += len(items)
+    counts['inventory_movements'] += len(movements)
+
+
+class Recorder:
+    """Latencies and query counts per scenario, gathered around test client requests."""
+
+    def __init__(self):
+        self.samples = {}
+        self.queries = 0
+
+    def count_query(self, *args):
+        self.queries += 1
+
+    def request(self, name, call, *args, **kwargs):
+        self.queries = 0
+        start = time.perf_counter()
+        response = _isolated(call, *args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(name, []).append((elapsed, self.queries, response.status_code))
+        return response
+
+
+def _isolated(call, *args, **kwargs):
+    # A request reuses an app context that is already pushed (as under the
+    # flask CLI), sharing its session and ``g`` with every other request;
+    # a fresh context per request gets its own, as in production.
+    with current_app._get_current_object().app_context() if has_app_context() else nullcontext():
+        return call(*args, **kwargs)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def run_benchmark(app, iterations=50, slug=None, prefix='bench', warmup=5):
+    """Drive the real routes through the test client and return a JSON-ready report.
+
+    Scenarios: storefront search (``pharmacy_products``), cart
+    (``add_to_cart`` + cart page), checkout (form + submit), the pharmacy
+    admin orders page and the server admin home. ``warmup`` rounds run
+    first and are not recorded. Each endpoint reports p50/p99/mean latency
+    in milliseconds, the query counts and the non-2xx/3xx responses.
+    """
+    slug = slug or f'{prefix}-001'
+    with app.app_context():
+        pharmacy = Pharmacy.query.filter_by(slug=slug).first()
+        if pharmacy is None:
+            raise ValueError(f'No existe la farmacia {slug}; ejecute primero flask seed-bench')
+        product_ids = [product_id for product_id, in db.session.execute(
+            select(Product.id).where(Product.pharmacy_id == pharmacy.id, Product.is_active == True,
+                                     Product.stock_quantity > 0).order_by(Product.id).limit(200))]
+        order_pages = max(math.ceil(Order.query.filter_by(pharmacy_id=pharmacy.id).count()
+                                    / app.config['POSTS_PER_PAGE']), 1)
+        dataset = {'pharmacies': Pharmacy.query.count(), 'products': Product.query.count(),
+                   'orders': Order.query.count(), 'order_items': OrderItem.query.count()}
+        dialect = db.engine.dialect.name
+        engine = db.engine
+
+    rng = random.Random(0)
+    recorder = Recorder()
+    customer = app.test_client()
+    pharmacy_admin = app.test_client()
+    server_admin = app.test_client()
+    pharmacy_admin.post(f'/pharmacy/{slug}/admin/login', data={'email': f'admin@{slug}.test', 'password': BENCH_PASSWORD})
+    server_admin.post('/admin/login', data={'email': f'admin@{prefix}.test', 'password': BENCH_PASSWORD})
+
+    def round_trip(record):
+        call = recorder.request if record else (lambda name, call, *args, **kwargs: _isolated(call, *args, **kwargs))
+        term = rng.choice(SEARCH_TERMS)
+        call('pharmacy_products_search', customer.get, f'/pharmacy/{slug}/products', query_string={'search': term})
+        for product_id in rng.sample(product_ids, min(3, len(product_ids))):
+            call('add_to_cart', customer.post, f'/pharmacy/{slug}/add_to_cart',
+                 json={'product_id': product_id, 'quantity': 1})
+        call('pharmacy_cart', customer.get, f'/pharmacy/{slug}/cart')
+        call('pharmacy_checkout_form', customer.get, f'/pharmacy/{slug}/checkout')
+        call('pharmacy_checkout_submit', customer.post, f'/pharmacy/{slug}/checkout', data={
+            'customer_name': 'Cliente Benchmark', 'customer_email': 'bench@example.test',
+            'customer_phone': '0000000', 'customer_address': 'Calle Benchmark 1',
+            'idempotency_key': uuid.uuid4().hex})
+        call('pharmacy_admin_orders', pharmacy_admin.get, f'/pharmacy/{slug}/admin/orders',
+             query_string={'page': rng.randrange(1, order_pages + 1)})
+        call('admin_home', server_admin.get, '/')
+
+    event.listen(engine, 'before_cursor_execute', recorder.count_query)
+    try:
+        for _ in range(warmup):
+            round_trip(False)
+        for _ in range(iterations):
+            round_trip(True)
+    finally:
+        event.remove(engine, 'before_cursor_execute', recorder.count_query)
+
+    endpoints = {}
+    for name, samples in sorted(recorder.samples.items()):
+        latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+        queries = [count for _, count, _ in samples]
+        endpoints[name] = {
+            'requests': len(samples),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries_p50': percentile(queries, 50),
+            'queries_max': max(queries),
+            'errors': sum(1 for _, _, status in samples if status >= 400),
+        }
+    return {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'database': dialect,
+            'pharmacy': slug,
+            'iterations': iterations,
+            'warmup': warmup,
+            'fragment_cache': bool(app.config.get('FRAGMENT_CACHE_ENABLED')),
+            'dataset': dataset,
+        },
+        'endpoints': endpoints,
+    }
+
+
+# Run in a fresh interpreter: the master builds the app as gunicorn does with
+# preload_app, then a forked "worker" serves one request and reports the memory
+# it could not share with the master (Private_* in smaps_rollup, Linux only).
+STARTUP_SCRIPT = """
+import gc, json, os, resource, time
+start = time.perf_counter()
+from app import create_app, warm_up
+app = create_app()
+created = time.perf_counter()
+warm_up(app)
+gc.freeze()
+warmed = time.perf_counter()
+read_end, write_end = os.pipe()
+if os.fork() == 0:
+    request_start = time.perf_counter()
+    app.test_client().get('/admin/login')
+    worker = {'worker_first_request_ms': (time.perf_counter() - request_start) * 1000, 'worker_private_mb': None}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            private = sum(int(line.split()[1]) for line in f if line.startswith('Private_'))
+        worker['worker_private_mb'] = private / 1024
+    except OSError:
+        pass
+    os.write(write_end, json.dumps(worker).encode())
+    os._exit(0)
+os.close(write_end)
+os.wait()
+with os.fdopen(read_end) as f:
+    result = json.loads(f.read())
+result.update(create_app_ms=(created - start) * 1000, warm_up_ms=(warmed - created) * 1000,
+              master_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+print(json.dumps(result))
+"""
+
+
+def measure_startup(runs=5):
+    """Cold start of the web app in fresh processes; medians over ``runs``.
+
+    Reports the time to import and build the app, to compile its templates,
+    the first request of a forked worker, the master's peak RSS and the
+    memory each worker does not share with the master.
+    """
+    # Measured as a web process, not as the flask command this may run under.
+    env = {key: value for key, value in os.environ.items() if key != 'FLASK_RUN_FROM_CLI'}
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), env=env).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(sample[key] for sample in samples), 1) if samples[0][key] is not None else None
+            for key in samples[0]}
+
+
+def compare_reports(baseline, current):
+    """Return ``(endpoint, metric, before, after, change %)`` rows for the endpoints in both reports."""
+    rows = []
+    for name, after in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms', 'queries_p50'):
+            if before.get(metric):
+                change = (after[metric] - before[metric]) / before[metric] * 100
+                rows.append((name, metric, before[metric], after[metric], round(change, 1)))
+    return rows
+
+
+def write_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
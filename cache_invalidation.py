@@ -0,0 +1,36 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CommitInvalidation:
+    """Cache keys made stale by a transaction, invalidated once it commits.
+
+    Writers mark the keys they change in ``session.info``; after the commit
+    lands they are passed to ``invalidate(*keys)``, and a rollback discards
+    them. Invalidating any earlier would let a concurrent request cache the
+    old rows again before the change is visible.
+    """
+
+    def __init__(self, name, invalidate):
+        self.info_key = f'stale_{name}'
+        self.invalidate = invalidate
+        event.listen(Session, 'after_commit', self._invalidate_stale)
+        event.listen(Session, 'after_rollback', self._discard_stale)
+
+    def mark(self, session, *keys):
+        """Invalidate ``keys`` when ``session`` commits."""
+        session.info.setdefault(self.info_key, set()).update(keys)
+
+    def mark_for(self, target, *keys):
+        """``mark`` from a mapper event, on the session ``target`` belongs to."""
+        session = Session.object_session(target)
+        if session is not None:
+            self.mark(session, *keys)
+
+    def _invalidate_stale(self, session):
+        stale = session.info.pop(self.info_key, None)
+        if stale:
+            self.invalidate(*stale)
+
+    def _discard_stale(self, session):
+        session.info.pop(self.info_key, None)
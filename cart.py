@@ -0,0 +1,32 @@
+from models import Product
+
+
+def resolve_cart(pharmacy, cart):
+    """Resolve a ``{product_id: quantity}`` cart for ``pharmacy`` with a single ``IN`` query.
+    
+    Returns ``(cart_items, total)``; lines whose product is missing, inactive
+    or belongs to another pharmacy are skipped.
+    """
+    product_ids = {int(product_id) for product_id in cart if str(product_id).isdigit()}
+    if not product_ids:
+        return [], 0
+    
+    products = Product.query.filter(Product.pharmacy_id == pharmacy.id,
+                                    Product.is_active == True,
+                                    Product.id.in_(product_ids)).all()
+    products_by_id = {product.id: product for product in products}
+    
+    cart_items = []
+    total = 0
+    for product_id, quantity in cart.items():
+        product = products_by_id.get(int(product_id)) if str(product_id).isdigit() else None
+        if product:
+            subtotal = product.price * quantity
+            cart_items.append({
+                'product': product,
+                'quantity': quantity,
+                'subtotal': subtotal
+            })
+            total += subtotal
+    
+    return cart_items, total
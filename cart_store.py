@@ -0,0 +1,191 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Cart, CartLine
+
+cart_table = Cart.__table__
+line_table = CartLine.__table__
+
+
+def new_cart_id():
+    return uuid.uuid4().hex
+
+
+class DatabaseCartBackend:
+    """Carts in the ``cart``/``cart_line`` tables, shared by every worker process.
+
+    Each line change is a single-row statement on the line's primary key,
+    so its cost does not depend on the size of the cart.
+    """
+
+    def get(self, cart_id, pharmacy_id):
+        rows = db.session.execute(
+            select(line_table.c.product_id, line_table.c.quantity)
+            .where(line_table.c.cart_id == cart_id, line_table.c.pharmacy_id == pharmacy_id)
+        )
+        return {str(product_id): quantity for product_id, quantity in rows}
+
+    def add(self, cart_id, pharmacy_id, product_id, quantity):
+        def apply():
+            key = self._touch(cart_id, pharmacy_id, product_id)
+            result = db.session.execute(update(line_table).where(key)
+                                        .values(quantity=line_table.c.quantity + quantity))
+            if result.rowcount == 0:
+                self._insert_line(cart_id, pharmacy_id, product_id, quantity)
+        return self._write(apply, cart_id, pharmacy_id)
+
+    def set(self, cart_id, pharmacy_id, product_id, quantity):
+        def apply():
+            key = self._touch(cart_id, pharmacy_id, product_id)
+            if quantity <= 0:
+                db.session.execute(delete(line_table).where(key))
+            else:
+                result = db.session.execute(update(line_table).where(key).values(quantity=quantity))
+                if result.rowcount == 0:
+                    self._insert_line(cart_id, pharmacy_id, product_id, quantity)
+        return self._write(apply, cart_id, pharmacy_id)
+
+    def clear(self, cart_id, pharmacy_id):
+        db.session.execute(delete(line_table).where(line_table.c.cart_id == cart_id,
+                                                    line_table.c.pharmacy_id == pharmacy_id))
+        db.session.commit()
+
+    def prune(self, max_age):
+        horizon = datetime.utcnow() - max_age
+        expired = select(cart_table.c.id).where(cart_table.c.updated_at < horizon)
+        db.session.execute(delete(line_table).where(line_table.c.cart_id.in_(expired)))
+        deleted = db.session.execute(delete(cart_table).where(cart_table.c.updated_at < horizon)).rowcount
+        db.session.commit()
+        return deleted
+
+    def _write(self, apply, cart_id, pharmacy_id):
+        """Run ``apply`` and commit; returns the number of lines in the cart."""
+        try:
+            apply()
+            return self._commit_count(cart_id, pharmacy_id)
+        except IntegrityError:
+            # A concurrent request created the cart or the line first; now
+            # the rows exist and the retry takes the update path.
+            db.session.rollback()
+            apply()
+            return self._commit_count(cart_id, pharmacy_id)
+
+    def _touch(self, cart_id, pharmacy_id, product_id):
+        """Bump the cart's ``updated_at``, creating the cart if needed; returns the line key."""
+        now = datetime.utcnow()
+        result = db.session.execute(update(cart_table).where(cart_table.c.id == cart_id).values(updated_at=now))
+        if result.rowcount == 0:
+            # First line of the cart, or a cart pruned while the cookie lived on.
+            db.session.execute(insert(cart_table).values(id=cart_id, created_at=now, updated_at=now))
+        return ((line_table.c.cart_id == cart_id) &
+                (line_table.c.pharmacy_id == pharmacy_id) &
+                (line_table.c.product_id == int(product_id)))
+
+    def _insert_line(self, cart_id, pharmacy_id, product_id, quantity):
+        db.session.execute(insert(line_table).values(cart_id=cart_id, pharmacy_id=pharmacy_id,
+                                                     product_id=int(product_id), quantity=quantity))
+
+    def _commit_count(self, cart_id, pharmacy_id):
+        count = db.session.execute(
+            select(func.count())
+            .select_from(line_table)
+            .where(line_table.c.cart_id == cart_id, line_table.c.pharmacy_id == pharmacy_id)
+        ).scalar()
+        db.session.commit()
+        return count
+
+
+class MemoryCartBackend:
+    """Carts in a dict of this process; for development and single-process deployments."""
+
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def get(self, cart_id, pharmacy_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            return dict(cart[1].get(pharmacy_id, {})) if cart else {}
+
+    def add(self, cart_id, pharmacy_id, product_id, quantity):
+        with self._lock:
+            lines = self._lines(cart_id, pharmacy_id)
+            lines[str(product_id)] = lines.get(str(product_id), 0) + quantity
+            return len(lines)
+
+    def set(self, cart_id, pharmacy_id, product_id, quantity):
+        with self._lock:
+            lines = self._lines(cart_id, pharmacy_id)
+            if quantity <= 0:
+                lines.pop(str(product_id), None)
+            else:
+                lines[str(product_id)] = quantity
+            return len(lines)
+
+    def clear(self, cart_id, pharmacy_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart:
+                cart[1].pop(pharmacy_id, None)
+
+    def prune(self, max_age):
+        horizon = time.monotonic() - max_age.total_seconds()
+        with self._lock:
+            expired = [cart_id for cart_id, (touched, _) in self._carts.items() if touched < horizon]
+            for cart_id in expired:
+                del self._carts[cart_id]
+        return len(expired)
+
+    def _lines(self, cart_id, pharmacy_id):
+        _, pharmacies = self._carts.get(cart_id, (None, {}))
+        self._carts[cart_id] = (time.monotonic(), pharmacies)
+        return pharmacies.setdefault(pharmacy_id, {})
+
+
+BACKENDS = {'database': DatabaseCartBackend, 'memory': MemoryCartBackend}
+
+
+class CartStore:
+    """Server-side carts keyed by cart id and pharmacy.
+
+    Carts are ``{product_id: quantity}`` dicts, the shape ``cart.resolve_cart``
+    takes. The backend is chosen with ``CART_BACKEND``.
+    """
+
+    def __init__(self, backend='database', ttl_days=30):
+        self.backend = BACKENDS[backend]()
+        self.ttl = timedelta(days=ttl_days)
+
+    def init_app(self, app):
+        self.backend = BACKENDS[app.config.get('CART_BACKEND', 'database')]()
+        self.ttl = timedelta(days=app.config.get('CART_TTL_DAYS', self.ttl.days))
+        app.extensions['cart_store'] = self
+
+    def get(self, cart_id, pharmacy_id):
+        if not cart_id:
+            return {}
+        return self.backend.get(cart_id, pharmacy_id)
+
+    def add(self, cart_id, pharmacy_id, product_id, quantity):
+        """Add ``quantity`` to a line; returns the number of lines in the cart."""
+        return self.backend.add(cart_id, pharmacy_id, product_id, quantity)
+
+    def set(self, cart_id, pharmacy_id, product_id, quantity):
+        """Set a line's quantity, removing it when ``quantity`` is 0; returns the number of lines."""
+        return self.backend.set(cart_id, pharmacy_id, product_id, quantity)
+
+    def clear(self, cart_id, pharmacy_id):
+        if cart_id:
+            self.backend.clear(cart_id, pharmacy_id)
+
+    def prune(self):
+        """Remove carts not modified within ``CART_TTL_DAYS``; returns how many."""
+        return self.backend.prune(self.ttl)
+
+
+cart_store = CartStore()
@@ -0,0 +1,129 @@
+import base64
+import json
+import math
+
+from sqlalchemy import func, tuple_
+
+from models import db, Product
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor cannot be decoded or was issued for another ordering."""
+
+
+class KeysetPage:
+    """One page of a keyset-paginated product listing."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, ranked=False):
+    """Return the ``(sort value, id)`` pair stored in ``cursor``, or ``None`` if there is none.
+
+    The sort value must be a name, or a search rank when ``ranked``; a
+    cursor that does not decode to that shape raises ``InvalidCursor``.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, product_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if ranked:
+        valid_value = (isinstance(value, (int, float)) and not isinstance(value, bool)
+                       and math.isfinite(value))
+    else:
+        valid_value = isinstance(value, str)
+    if not valid_value or isinstance(product_id, bool) or not isinstance(product_id, int):
+        raise InvalidCursor(cursor)
+    return value, product_id
+
+
+def filter_products(query, category=None, max_price=None):
+    """Apply the storefront ``category`` and ``max_price`` filters to ``query``."""
+    if category:
+        query = query.filter(Product.category == category)
+
+    if max_price and max_price.isdigit():
+        query = query.filter(Product.price <= float(max_price))
+
+    return query
+
+
+def paginate_products(query, per_page, after=None, before=None, rank=None):
+    """Return a ``KeysetPage`` of ``query`` ordered by ``(name, id)``.
+
+    When ``rank`` is given (see ``search.search_products``) the page is
+    ordered by ``(rank, id)`` instead. ``after`` and ``before`` are cursors
+    from a previous page of the same ordering; ``InvalidCursor`` is raised
+    for anything else. Each page is a single ``LIMIT per_page + 1`` range
+    scan, so its cost does not depend on how deep into the catalog the
+    client has paged.
+    """
+    sort_column = Product.name if rank is None else rank
+    if rank is not None:
+        query = query.add_columns(rank.label('search_rank'))
+    key = tuple_(sort_column, Product.id)
+    after = decode_cursor(after, ranked=rank is not None)
+    before = decode_cursor(before, ranked=rank is not None) if after is None else None
+
+    if before is not None:
+        rows = (query.filter(key < before)
+                .order_by(sort_column.desc(), Product.id.desc())
+                .limit(per_page + 1)
+                .all())
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        return _page(rows, rank,
+                     next_row=rows[-1] if rows else None,
+                     prev_row=rows[0] if has_more else None)
+
+    if after is not None:
+        query = query.filter(key > after)
+
+    rows = query.order_by(sort_column, Product.id).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return _page(rows, rank,
+                 next_row=rows[-1] if has_more else None,
+                 prev_row=rows[0] if after is not None and rows else None)
+
+
+def _page(rows, rank, next_row, prev_row):
+    if rank is None:
+        items = rows
+        cursor = lambda product: encode_cursor((product.name, product.id))
+    else:
+        items = [row[0] for row in rows]
+        cursor = lambda row: encode_cursor((row.search_rank, row[0].id))
+    return KeysetPage(items,
+                      next_cursor=cursor(next_row) if next_row is not None else None,
+                      prev_cursor=cursor(prev_row) if prev_row is not None else None)
+
+
+def category_counts(pharmacy_id):
+    """Return ``[(category, product_count), ...]`` for the active catalog."""
+    return (db.session.query(Product.category, func.count(Product.id))
+            .filter(Product.pharmacy_id == pharmacy_id,
+                    Product.is_active == True,
+                    Product.category.isnot(None))
+            .group_by(Product.category)
+            .order_by(Product.category)
+            .all())
@@ -0,0 +1,77 @@
+import uuid
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from inventory import reserve_stock
+from models import db, Order, OrderItem
+
+order_item_table = OrderItem.__table__
+
+
+def generate_order_number(pharmacy):
+    return f"{pharmacy.slug.upper()}-{uuid.uuid4().hex[:8].upper()}"
+
+
+def generate_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def find_order(pharmacy, idempotency_key):
+    return Order.query.filter_by(pharmacy_id=pharmacy.id, idempotency_key=idempotency_key).first()
+
+
+def place_order(pharmacy, customer, cart_items, idempotency_key=None):
+    """Create and commit an order for resolved ``cart_items`` in one transaction.
+    
+    ``customer`` holds the ``customer_*`` fields. The total is computed from
+    the products' current prices, never taken from the client. Stock is
+    reserved in the same transaction; raises ``inventory.OutOfStock`` if a
+    line cannot be covered, in which case nothing is written.
+    
+    Returns ``(order, created)``. When ``idempotency_key`` matches an order
+    already placed for the pharmacy, that order is returned with ``created``
+    false and nothing else happens, so a double-submitted checkout cannot
+    create or charge stock for a second order.
+    """
+    if idempotency_key:
+        existing = find_order(pharmacy, idempotency_key)
+        if existing is not None:
+            return existing, False
+    
+    order_number = generate_order_number(pharmacy)
+    reserve_stock(cart_items, reference=order_number)
+    
+    order = Order(
+        order_number=order_number,
+        customer_name=customer['customer_name'],
+        customer_email=customer['customer_email'],
+        customer_phone=customer.get('customer_phone'),
+        customer_address=customer['customer_address'],
+        total_amount=sum(item['subtotal'] for item in cart_items),
+        status='pending',
+        payment_status='pending',
+        pharmacy_id=pharmacy.id,
+        idempotency_key=idempotency_key or None
+    )
+    db.session.add(order)
+    
+    try:
+        db.session.flush()
+        db.session.execute(insert(order_item_table), [
+            {'order_id': order.id,
+             'product_id': item['product'].id,
+             'quantity': item['quantity'],
+             'price': item['product'].price}
+            for item in cart_items
+        ])
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent submit with the same key won the race; the rollback
+        # also returns the stock reserved above.
+        db.session.rollback()
+        existing = find_order(pharmacy, idempotency_key) if idempotency_key else None
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
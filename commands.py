@@ -0,0 +1,181 @@
+import json
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from cart_store import cart_store
+from jobs import run_worker
+from metrics import rebuild_daily_metrics
+from models import db, Pharmacy, User
+from order_stats import rebuild_order_stats
+from product_io import read_rows, import_products
+from reports import prune_reports
+from search import rebuild_search_index
+from sync import prune_tombstones
+
+
+@click.command('create-admin')
+@click.argument('name')
+@click.argument('email')
+@click.argument('password')
+@with_appcontext
+def create_admin(name, email, password):
+    """Crea un usuario administrador del sistema."""
+    if User.query.filter_by(email=email).first():
+        print('Ya existe un usuario con ese email.')
+        return
+    admin = User(name=name, email=email, role='server_admin', is_active=True)
+    admin.set_password(password)
+    db.session.add(admin)
+    db.session.commit()
+    print(f'Usuario administrador creado: {email}')
+
+
+@click.command('seed-bench')
+@click.option('--pharmacies', type=int, default=5, help='Número de farmacias.')
+@click.option('--products', type=int, default=500, help='Productos por farmacia.')
+@click.option('--orders', type=int, default=2000, help='Pedidos históricos por farmacia.')
+@click.option('--days', type=int, default=180, help='Días de historial de pedidos.')
+@click.option('--seed', type=int, default=42, help='Semilla aleatoria; los mismos valores generan los mismos datos.')
+@click.option('--prefix', default='bench', help='Prefijo de los slugs y correos generados.')
+@with_appcontext
+def seed_bench_command(pharmacies, products, orders, days, seed, prefix):
+    """Genera datos sintéticos (farmacias, productos, pedidos, movimientos) para pruebas de rendimiento."""
+    from benchmark import BENCH_PASSWORD, seed_bench
+    try:
+        counts = seed_bench(pharmacies, products, orders, days=days, seed=seed, prefix=prefix)
+    except ValueError as e:
+        print(e)
+        return
+    print(', '.join(f'{name}: {count}' for name, count in counts.items()))
+    print(f'Usuarios: admin@{prefix}.test y admin@{prefix}-NNN.test, contraseña {BENCH_PASSWORD!r}.')
+
+
+@click.command('bench')
+@click.option('--iterations', type=int, default=50, help='Rondas medidas por escenario.')
+@click.option('--warmup', type=int, default=5, help='Rondas previas sin medir.')
+@click.option('--slug', default=None, help='Farmacia a usar (por defecto <prefix>-001).')
+@click.option('--prefix', default='bench', help='Prefijo usado en seed-bench.')
+@click.option('--output', type=click.Path(dir_okay=False), default='bench-report.json', help='Archivo JSON del reporte.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), default=None, help='Reporte anterior con el que comparar.')
+@with_appcontext
+def bench_command(iterations, warmup, slug, prefix, output, baseline):
+    """Mide latencia p50/p99 y consultas SQL por endpoint con el cliente de pruebas."""
+    from benchmark import compare_reports, run_benchmark, write_report
+    try:
+        report = run_benchmark(current_app._get_current_object(), iterations=iterations, slug=slug, prefix=prefix,
+                               warmup=warmup)
+    except ValueError as e:
+        print(e)
+        return
+    write_report(report, output)
+    for name, stats in report['endpoints'].items():
+        print(f"{name:28} p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+              f"consultas {stats['queries_p50']:>3}  errores {stats['errors']}")
+    if baseline:
+        with open(baseline, encoding='utf-8') as f:
+            previous = json.load(f)
+        for name, metric, before, after, change in compare_reports(previous, report):
+            print(f'{name:28} {metric:12} {before:>10} -> {after:>10} ({change:+.1f}%)')
+    print(f'Reporte guardado en {output}.')
+
+
+@click.command('bench-startup')
+@click.option('--runs', type=int, default=5, help='Procesos nuevos a medir.')
+def bench_startup_command(runs):
+    """Mide el arranque en frío: creación de la app, compilación de plantillas y memoria por worker."""
+    from benchmark import measure_startup
+    for name, value in measure_startup(runs).items():
+        print(f'{name:24} {value}')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Crea y repuebla el índice de búsqueda de productos."""
+    with db.engine.begin() as connection:
+        rebuild_search_index(connection)
+    print('Índice de búsqueda reconstruido.')
+
+
+@click.command('refresh-metrics')
+@click.option('--days', type=int, default=None, help='Recalcular solo los últimos N días.')
+@with_appcontext
+def refresh_metrics(days):
+    """Recalcula las métricas diarias de pedidos a partir de la tabla de pedidos."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1) if days else None
+    buckets = rebuild_daily_metrics(since)
+    print(f'Métricas recalculadas: {buckets} registros diarios.')
+
+
+@click.command('rebuild-order-stats')
+@with_appcontext
+def rebuild_order_stats_command():
+    """Recalcula los totales de pedidos por farmacia a partir de la tabla de pedidos."""
+    pharmacies = rebuild_order_stats()
+    print(f'Totales recalculados: {pharmacies} farmacias.')
+
+
+@click.command('prune-tombstones')
+@with_appcontext
+def prune_tombstones_command():
+    """Elimina las marcas de productos borrados más antiguas que la retención de sincronización."""
+    deleted = prune_tombstones(current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+    print(f'Marcas eliminadas: {deleted}.')
+
+
+@click.command('import-products')
+@click.argument('slug')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_products_command(slug, path):
+    """Importa o actualiza productos de una farmacia desde un archivo CSV o XLSX."""
+    pharmacy = Pharmacy.query.filter_by(slug=slug).first()
+    if pharmacy is None:
+        print(f'No existe la farmacia {slug}.')
+        return
+    with open(path, 'rb') as f:
+        result = import_products(pharmacy.id, read_rows(f, path))
+    for row_number, message in result.errors:
+        print(f'Fila {row_number}: {message}')
+    print(f'Productos importados: {result.imported}. Filas con errores: {len(result.errors)}.')
+
+
+@click.command('prune-carts')
+@with_appcontext
+def prune_carts_command():
+    """Elimina los carritos sin actividad durante más de CART_TTL_DAYS días."""
+    deleted = cart_store.prune()
+    print(f'Carritos eliminados: {deleted}.')
+
+
+@click.command('prune-reports')
+@with_appcontext
+def prune_reports_command():
+    """Elimina los reportes generados más antiguos que la retención configurada."""
+    deleted = prune_reports(current_app.config['REPORT_RETENTION_DAYS'])
+    print(f'Reportes eliminados: {deleted}.')
+
+
+@click.command('run-worker')
+@click.option('--once', is_flag=True, help='Procesar las tareas pendientes y salir.')
+@with_appcontext
+def run_worker_command(once):
+    """Procesa en segundo plano la cola de tareas (imágenes, limpieza de archivos)."""
+    processed = run_worker(poll_interval=current_app.config['JOB_POLL_INTERVAL'],
+                           timeout=current_app.config['JOB_TIMEOUT'],
+                           once=once)
+    if once:
+        print(f'Tareas procesadas: {processed}.')
+
+
+COMMANDS = (create_admin, seed_bench_command, bench_command, bench_startup_command, rebuild_search_index_command,
+            refresh_metrics, rebuild_order_stats_command, prune_tombstones_command, import_products_command,
+            prune_carts_command, prune_reports_command, run_worker_command)
+
+
+def init_app(app):
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -12,11 +12,92 @@ class Config:
     
     # File upload settings
     UPLOAD_FOLDER = 'static/uploads'
+    STAGING_FOLDER = os.environ.get('STAGING_FOLDER', 'instance/incoming')  # raw uploads awaiting a job; never served
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # Product image variants (longest side in pixels)
+    IMAGE_VARIANTS = {'thumb': 160, 'card': 480, 'detail': 1200}
+    IMAGE_WEBP_QUALITY = 80
+    IMAGE_JPEG_QUALITY = 82
+    
+    # Static files: let the front proxy send files instead of Python
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')  # Apache / lighttpd
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')  # nginx internal location, e.g. /_static/
+    
+    # Tenant resolution cache (seconds a slug -> pharmacy lookup is reused)
+    TENANT_CACHE_TTL = int(os.environ.get('TENANT_CACHE_TTL', 60))
+    
+    # Dashboard metrics (seconds a counter snapshot is reused)
+    METRICS_CACHE_TTL = int(os.environ.get('METRICS_CACHE_TTL', 300))
+    LOW_STOCK_THRESHOLD = 10
+    
+    # Incremental catalog sync
+    SYNC_PAGE_SIZE = 500
+    SYNC_TOMBSTONE_RETENTION_DAYS = 90
+    SYNC_OVERLAP_SECONDS = 60  # longest a transaction writing products may stay open; such changes are sent again
+    
+    # Background jobs
+    JOB_POLL_INTERVAL = 1.0  # seconds the worker sleeps when the queue is empty
+    JOB_TIMEOUT = 600  # seconds before a running job is considered abandoned
+    JOBS_EAGER = os.environ.get('JOBS_EAGER', '').lower() in ('1', 'true', 'yes')  # run jobs in-request (dev only)
+    # Jobs read and write files on local disk (staged uploads, product images, reports), so they
+    # must run on the web instance: either a `flask run-worker` process next to gunicorn, or, with
+    # JOBS_IN_WEB, a thread in the gunicorn workers, one of which at a time holds JOBS_LOCK_FILE and polls
+    JOBS_IN_WEB = os.environ.get('JOBS_IN_WEB', '').lower() in ('1', 'true', 'yes')
+    JOBS_LOCK_FILE = os.environ.get('JOBS_LOCK_FILE', 'instance/jobs.lock')
+    
+    # Shopping carts ('database' or 'memory'; memory only for a single process)
+    CART_BACKEND = os.environ.get('CART_BACKEND', 'database')
+    CART_TTL_DAYS = 30  # carts untouched for longer are removed by `flask prune-carts`
+    
+    # Reports
+    REPORT_FOLDER = os.environ.get('REPORT_FOLDER', 'reports')  # Outside static/: served only to the pharmacy admin
+    REPORT_RETENTION_DAYS = 7
+    
+    # Compiled Jinja templates cached on disk (None: a per-user directory under the system temp dir)
+    JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+    
+    # Password hashing, written out in full as it appears before the first '$' of a hash
+    # (e.g. 'scrypt:32768:8:1'); hashes made otherwise are replaced at the user's next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    
+    # Login throttling: token buckets of (attempts, seconds) per client IP, per account and overall
+    LOGIN_THROTTLE_ENABLED = os.environ.get('LOGIN_THROTTLE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LOGIN_THROTTLE_BACKEND = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')  # 'memory' per process, or 'redis'
+    LOGIN_THROTTLE_URL = os.environ.get('LOGIN_THROTTLE_URL', 'redis://localhost:6379/0')
+    LOGIN_THROTTLE_IP = (10, 60)
+    LOGIN_THROTTLE_ACCOUNT = (5, 300)
+    LOGIN_THROTTLE_GLOBAL = (600, 60)  # bounds the CPU all logins together can spend hashing
+    LOGIN_THROTTLE_TRUSTED_TTL = 30 * 24 * 3600  # seconds an IP an account logged in from keeps its own account bucket
+    
+    # Number of proxies in front of the app whose X-Forwarded-For is trusted (0: use the socket address)
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    
     # Pagination
     POSTS_PER_PAGE = 20
     
+    # Rendered storefront fragments ('memory' LRU per process, or 'redis' shared by all processes)
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL', 'redis://localhost:6379/0')
+    FRAGMENT_CACHE_TTL = 300  # also bounds how stale other processes are with the memory backend
+    FRAGMENT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    
+    # Audit log: changes are buffered and written in bulk by a background thread
+    AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AUDIT_BACKGROUND_FLUSH = True  # False: flush at the end of the request that crosses a threshold
+    AUDIT_FLUSH_SIZE = 100  # entries
+    AUDIT_FLUSH_INTERVAL = 5.0  # seconds
+    AUDIT_MAX_BUFFER = 10000  # upper bound on entries lost if the process dies
+    
+    # Request instrumentation: Prometheus text on /admin/metrics, Server-Timing headers (always on in debug)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token for scrapers; server admins can always read it
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+    
+    # Per-view query budgets (see query_budget.py); strict mode raises instead of logging
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '').lower() in ('1', 'true', 'yes')
+    
     # Subscription settings
     SUBSCRIPTION_PRICE = 99.99  # Monthly subscription price in USD
     
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+from sqlalchemy import event
+
+from cache_invalidation import CommitInvalidation
+from models import Pharmacy, Product
+
+try:
+    import redis
+except ImportError:  # optional: only needed for FRAGMENT_CACHE_BACKEND = 'redis'
+    redis = None
+
+
+class MemoryFragmentBackend:
+    """LRU of rendered fragments in this process, bounded by their total size.
+
+    Catalog versions are per process too, so a change is only seen by other
+    worker processes once their entries expire (``FRAGMENT_CACHE_TTL``).
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def version(self, pharmacy_id):
+        with self._lock:
+            return self._versions.get(pharmacy_id, 0)
+
+    def bump(self, pharmacy_id):
+        with self._lock:
+            self._versions[pharmacy_id] = self._versions.get(pharmacy_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class RedisFragmentBackend:
+    """Fragments and catalog versions in Redis, shared by every worker process.
+
+    A bump is seen by all processes at once. Superseded fragments are left
+    to expire; size-bounded eviction is Redis' own ``maxmemory-policy``.
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('FRAGMENT_CACHE_BACKEND = "redis" needs the redis package')
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(f'fragment:{key}')
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(f'fragment:{key}', value.encode('utf-8'), ex=ttl)
+
+    def version(self, pharmacy_id):
+        return int(self.client.get(f'catalog-version:{pharmacy_id}') or 0)
+
+    def bump(self, pharmacy_id):
+        self.client.incr(f'catalog-version:{pharmacy_id}')
+
+    def clear(self):
+        for key in self.client.scan_iter('fragment:*'):
+            self.client.delete(key)
+
+
+class FragmentCache:
+    """Rendered storefront fragments keyed by pharmacy, catalog version and arguments.
+
+    A commit that changes a pharmacy's products (or the pharmacy itself)
+    bumps its catalog version, so every fragment rendered before the change
+    stops being looked up at once. The backend is chosen with
+    ``FRAGMENT_CACHE_BACKEND``.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.enabled = True
+        self.backend = MemoryFragmentBackend()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('FRAGMENT_CACHE_TTL', self.ttl)
+        self.enabled = app.config.get('FRAGMENT_CACHE_ENABLED', self.enabled)
+        if app.config.get('FRAGMENT_CACHE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisFragmentBackend(app.config['FRAGMENT_CACHE_URL'])
+        else:
+            self.backend = MemoryFragmentBackend(app.config.get('FRAGMENT_CACHE_MAX_BYTES', self.backend.max_bytes))
+        app.extensions['fragment_cache'] = self
+
+    def fragment(self, pharmacy_id, name, parts, render):
+        """Return the cached fragment for ``(name, parts)``, calling ``render()`` on a miss.
+
+        ``parts`` are the arguments the fragment depends on besides the
+        catalog, e.g. the listing filters; ``render`` must return the HTML.
+        """
+        if not self.enabled:
+            return Markup(render())
+        key = ':'.join((str(pharmacy_id), str(self.backend.version(pharmacy_id)), name,
+                        json.dumps(parts, separators=(',', ':'), default=str)))
+        html = self.backend.get(key)
+        if html is None:
+            html = render()
+            self.backend.set(key, html, self.ttl)
+        return Markup(html)
+
+    def bump(self, *pharmacy_ids):
+        for pharmacy_id in pharmacy_ids:
+            self.backend.bump(pharmacy_id)
+
+    def clear(self):
+        self.backend.clear()
+
+
+fragment_cache = FragmentCache()
+
+# Catalog versions are bumped once the commit that changed the rows lands.
+stale_catalogs = CommitInvalidation('catalogs', fragment_cache.bump)
+
+
+def _mark_product_catalog(mapper, connection, target):
+    stale_catalogs.mark_for(target, target.pharmacy_id)
+
+
+def _mark_pharmacy_catalog(mapper, connection, target):
+    stale_catalogs.mark_for(target, target.id)
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Product, _event, _mark_product_catalog)
+event.listen(Pharmacy, 'after_update', _mark_pharmacy_catalog)
@@ -0,0 +1,51 @@
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+wsgi_app = 'app:create_app()'
+
+# Import and build the app once in the master; workers are forked from it and
+# share its memory copy-on-write instead of each importing everything again.
+preload_app = True
+
+# Recycle workers now and then so memory they grow privately is given back.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+# Seconds a stopping worker gets to finish its requests and, with JOBS_IN_WEB,
+# the job it is running; a job cut off here is requeued after JOB_TIMEOUT.
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 120))
+
+
+def when_ready(server):
+    """Master, after the preload and before the first fork."""
+    from app import warm_up
+
+    warm_up(server.app.wsgi())
+    # Move everything loaded so far out of the collector's reach: a collection
+    # in a worker would otherwise write to (and so copy) every shared page.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes; the master should
+    # not have opened any, but drop whatever the pool holds just in case.
+    from models import db
+    import jobs
+
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if app.config['JOBS_IN_WEB']:
+        jobs.start_worker_thread(app)
+
+
+def worker_exit(server, worker):
+    # Let the job thread finish the job it is running instead of leaving it
+    # marked as running until JOB_TIMEOUT requeues it.
+    import jobs
+
+    jobs.stop_worker_thread(timeout=server.cfg.graceful_timeout)
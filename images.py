@@ -0,0 +1,143 @@
+import hashlib
+import io
+import os
+import uuid
+
+from flask import current_app
+
+from models import db, Product, PRODUCT_IMAGE_URL
+from jobs import job_handler, enqueue, JobFailed
+
+IMAGE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def product_image_folder():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'products')
+
+
+def variant_path(image_hash, variant, fmt):
+    return os.path.join(product_image_folder(), f'{image_hash}-{variant}.{fmt}')
+
+
+def stage_product_image(product, file_storage):
+    """Save an upload as-is and queue its processing for ``product``.
+
+    The product keeps its current image until the worker has written the
+    resized variants. ``product`` must be flushed so it has an id.
+    """
+    folder = current_app.config['STAGING_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, uuid.uuid4().hex)
+    file_storage.save(path)
+    return enqueue('process_product_image', pharmacy_id=product.pharmacy_id, product_id=product.id, path=path)
+
+
+def save_product_image(data):
+    """Store resized WebP and JPEG variants of image bytes and return their content hash.
+
+    Files are named after the hash of the uploaded bytes, so the same image
+    uploaded for several SKUs is processed and stored only once.
+    Raises ``ValueError`` when the data is not a readable image.
+    """
+    image_hash = hashlib.sha256(data).hexdigest()[:32]
+    variants = current_app.config['IMAGE_VARIANTS']
+
+    targets = [(variant, size, fmt) for variant, size in variants.items() for fmt in IMAGE_FORMATS]
+    if all(os.path.exists(variant_path(image_hash, variant, fmt)) for variant, _, fmt in targets):
+        return image_hash
+
+    # Imported here so that web processes, which only stage uploads, do not load Pillow.
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    os.makedirs(product_image_folder(), exist_ok=True)
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            original.load()
+            image = ImageOps.exif_transpose(original)
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError('El archivo no es una imagen válida') from e
+
+    for variant, size, fmt in targets:
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        _write_variant(resized, variant_path(image_hash, variant, fmt), fmt)
+
+    return image_hash
+
+
+def _write_variant(image, path, fmt):
+    if fmt == 'jpg':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            from PIL import Image
+
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        options = {'quality': current_app.config['IMAGE_JPEG_QUALITY'], 'optimize': True, 'progressive': True}
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        options = {'quality': current_app.config['IMAGE_WEBP_QUALITY'], 'method': 4}
+
+    # Write to a temporary name first so readers never see a partial file.
+    tmp_path = f'{path}.tmp'
+    image.save(tmp_path, IMAGE_FORMATS[fmt], **options)
+    os.replace(tmp_path, path)
+
+
+def product_image_url(image_hash):
+    """Value stored in ``Product.image_url`` for clients that only know that column."""
+    return PRODUCT_IMAGE_URL.format(image_hash=image_hash, variant='detail', fmt='jpg')
+
+
+@job_handler('process_product_image')
+def process_product_image(product_id, path):
+    """Job: resize a staged upload and point the product at it."""
+    product = db.session.get(Product, product_id)
+    if product is None:
+        _remove(path)
+        return
+    if not os.path.exists(path):
+        # Retrying cannot bring the upload back; fail so it shows in the jobs list.
+        raise JobFailed(f'El archivo subido ya no existe: {path}')
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        image_hash = save_product_image(data)
+    except ValueError as e:
+        _remove(path)
+        raise JobFailed(str(e)) from e
+
+    old_image = (product.image_hash, product.image_url)
+    product.image_hash = image_hash
+    product.image_url = product_image_url(image_hash)
+    if any(old_image) and old_image != (product.image_hash, product.image_url):
+        enqueue('release_product_image', pharmacy_id=product.pharmacy_id,
+                image_hash=old_image[0], image_url=old_image[1])
+    db.session.commit()
+    _remove(path)
+
+
+@job_handler('release_product_image')
+def release_product_image(image_hash, image_url):
+    """Delete the files of an image that no product references anymore.
+
+    Runs as a job queued in the transaction that detached the image, so the
+    product being edited or deleted no longer counts as a reference.
+    """
+    if image_hash:
+        if Product.query.filter_by(image_hash=image_hash).first() is None:
+            for variant in current_app.config['IMAGE_VARIANTS']:
+                for fmt in IMAGE_FORMATS:
+                    _remove(variant_path(image_hash, variant, fmt))
+    elif image_url:
+        if Product.query.filter_by(image_url=image_url).first() is None:
+            _remove(os.path.join(current_app.root_path, image_url.lstrip('/')))
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
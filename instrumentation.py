@@ -0,0 +1,172 @@
+import bisect
+import threading
+import time
+
+from flask import before_render_template, current_app, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from query_budget import query_count
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram, one series per label tuple."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, count, total) in sorted(self._series.items()):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation:
+    """Per-process request, SQL and template timings in Prometheus text format.
+
+    Every worker process keeps its own series, like ``metrics_cache``;
+    Prometheus sums them across the instances it scrapes. With
+    ``SERVER_TIMING``, and always in debug, each response also gets a
+    ``Server-Timing`` header with the phases of that request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram('dimafarm_request_duration_seconds', 'Request latency by endpoint.',
+                                          ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.sql_queries = Histogram('dimafarm_request_sql_queries', 'SQL statements run per request.',
+                                     ('endpoint',), QUERY_BUCKETS)
+        self.sql_duration = Histogram('dimafarm_request_sql_duration_seconds', 'SQL time per request.',
+                                      ('endpoint',), LATENCY_BUCKETS)
+        self.template_duration = Histogram('dimafarm_template_render_seconds', 'Template render time.',
+                                           ('template',), LATENCY_BUCKETS)
+        self.server_timing = False
+
+    def init_app(self, app):
+        self.server_timing = app.config.get('SERVER_TIMING', False)
+        app.extensions['instrumentation'] = self
+        # First in line, so the time spent in the other before_request hooks is measured.
+        app.before_request_funcs.setdefault(None, []).insert(0, _start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(_start_template, app)
+        template_rendered.connect(self._finish_template, app)
+
+        dispatch_request = app.dispatch_request
+
+        def timed_dispatch_request():
+            timing = g.get('timing')
+            if timing is not None:
+                timing['view_start'] = time.perf_counter()
+            return dispatch_request()
+
+        app.dispatch_request = timed_dispatch_request
+
+    def render(self):
+        """All series as a Prometheus text exposition."""
+        with self._lock:
+            lines = []
+            for histogram in (self.request_duration, self.sql_queries, self.sql_duration, self.template_duration):
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+    def _finish_request(self, response):
+        timing = g.pop('timing', None)
+        if timing is None:
+            return response
+        end = time.perf_counter()
+        total = end - timing['start']
+        queries = query_count() - timing['queries']
+        endpoint = request.endpoint or 'none'
+        with self._lock:
+            self.request_duration.observe((endpoint, request.method), total)
+            self.sql_queries.observe((endpoint,), queries)
+            self.sql_duration.observe((endpoint,), timing['sql'])
+
+        if self.server_timing or current_app.debug:
+            view_start = timing.get('view_start', end)
+            phases = [
+                ('before', view_start - timing['start'], None),
+                ('view', end - view_start, None),
+                ('db', timing['sql'], f'{queries} queries'),
+                ('tpl', timing['templates'], None),
+                ('total', total, None),
+            ]
+            response.headers['Server-Timing'] = ', '.join(
+                f'{name};dur={seconds * 1000:.1f}' + (f';desc="{desc}"' if desc else '')
+                for name, seconds, desc in phases
+            )
+        return response
+
+    def _finish_template(self, app, template, context, **extra):
+        timing = g.get('timing')
+        if timing is None or not timing['template_starts']:
+            return
+        elapsed = time.perf_counter() - timing['template_starts'].pop()
+        if not timing['template_starts']:
+            # Only the outermost render counts towards the request total.
+            timing['templates'] += elapsed
+        with self._lock:
+            self.template_duration.observe((template.name or 'string',), elapsed)
+
+
+def _start_request():
+    g.timing = {'start': time.perf_counter(), 'queries': query_count(), 'sql': 0.0,
+                'templates': 0.0, 'template_starts': []}
+
+
+def _start_template(app, template, context, **extra):
+    timing = g.get('timing')
+    if timing is not None:
+        timing['template_starts'].append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    timing = g.get('timing') if has_app_context() else None
+    if timing is not None:
+        timing['sql'] += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query(context):
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from sqlalchemy import case, insert, update
+
+from fragment_cache import stale_catalogs
+from metrics import stale_metrics
+from models import db, Product, InventoryMovement
+
+product_table = Product.__table__
+movement_table = InventoryMovement.__table__
+
+
+class OutOfStock(Exception):
+    """Raised when a reservation cannot be covered by the current stock.
+
+    ``products`` lists the ``Product`` instances that fell short.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__('Stock insuficiente para: ' + ', '.join(product.name for product in products))
+
+
+def reserve_stock(cart_items, reference, reason='Venta'):
+    """Take the quantities of ``cart_items`` out of stock in the current transaction.
+
+    All lines are decremented by one conditional ``UPDATE`` that only
+    matches products with enough stock left, so concurrent checkouts can
+    never drive stock negative nor overwrite each other's decrement. One
+    ``out`` ``InventoryMovement`` per product is then bulk inserted. Raises
+    ``OutOfStock`` (after rolling back) if any line cannot be covered; the
+    caller commits otherwise.
+    """
+    quantities = {}
+    products = {}
+    for item in cart_items:
+        product = item['product']
+        if item['quantity'] < 1:
+            raise ValueError('La cantidad debe ser mayor que cero')
+        quantities[product.id] = quantities.get(product.id, 0) + item['quantity']
+        products[product.id] = product
+    if not quantities:
+        return
+
+    quantity = case(quantities, value=product_table.c.id)
+    result = db.session.execute(
+        update(product_table)
+        .where(product_table.c.id.in_(quantities), product_table.c.stock_quantity >= quantity)
+        .values(stock_quantity=product_table.c.stock_quantity - quantity)
+    )
+    if result.rowcount != len(quantities):
+        stock = dict(db.session.query(Product.id, Product.stock_quantity).filter(Product.id.in_(quantities)))
+        db.session.rollback()
+        raise OutOfStock([products[product_id] for product_id, wanted in quantities.items()
+                          if (stock.get(product_id) or 0) < wanted])
+
+    # The rows are write-locked by the UPDATE above, so this reads our own result.
+    new_stock = dict(db.session.query(Product.id, Product.stock_quantity).filter(Product.id.in_(quantities)))
+    now = datetime.utcnow()
+    db.session.execute(insert(movement_table), [
+        {'product_id': product_id,
+         'movement_type': 'out',
+         'quantity': wanted,
+         'previous_stock': new_stock[product_id] + wanted,
+         'new_stock': new_stock[product_id],
+         'reason': reason,
+         'reference': reference,
+         'created_at': now}
+        for product_id, wanted in quantities.items()
+    ])
+    # Core updates bypass the mapper events that expire the stock counters
+    # and the cached storefront fragments, which show stock.
+    pharmacy_ids = {product.pharmacy_id for product in products.values()}
+    stale_metrics.mark(db.session, *(('products', pharmacy_id) for pharmacy_id in pharmacy_ids))
+    stale_catalogs.mark(db.session, *pharmacy_ids)
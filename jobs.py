@@ -0,0 +1,196 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+job_table = Job.__table__
+handlers = {}
+
+
+class JobFailed(Exception):
+    """Raised by a handler when retrying the job cannot succeed."""
+
+
+def job_handler(kind):
+    """Register ``func(**payload)`` as the handler for jobs of ``kind``."""
+    def decorator(func):
+        handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, pharmacy_id=None, **payload):
+    """Add a job to the current session; it is queued when the caller commits.
+    
+    Committing the job together with the change that needs it means neither
+    can be lost without the other.
+    """
+    job = Job(kind=kind, payload=json.dumps(payload), pharmacy_id=pharmacy_id)
+    db.session.add(job)
+    if current_app.config.get('JOBS_EAGER'):
+        db.session.flush()
+        db.session.info.setdefault('eager_jobs', []).append(job.id)
+    return job
+
+
+def init_app(app):
+    @app.after_request
+    def run_eager_jobs(response):
+        """With ``JOBS_EAGER`` run the jobs committed by this request before responding."""
+        while db.session.info.get('eager_jobs'):
+            for job_id in db.session.info.pop('eager_jobs'):
+                if claim(job_id):
+                    execute(db.session.get(Job, job_id))
+        return response
+
+
+def claim(job_id):
+    """Atomically move a pending job to running; False if another worker got it."""
+    result = db.session.execute(
+        update(job_table)
+        .where(job_table.c.id == job_id, job_table.c.status == 'pending')
+        .values(status='running', attempts=job_table.c.attempts + 1, updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def execute(job):
+    handler = handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise JobFailed(f'No handler registered for job kind {job.kind!r}')
+        handler(**json.loads(job.payload or '{}'))
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = traceback.format_exc(limit=5)
+        if isinstance(e, JobFailed) or job.attempts >= job.max_attempts:
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.run_at = datetime.utcnow() + timedelta(seconds=10 * 2 ** job.attempts)
+        logger.exception('Job %s (%s) failed, attempt %s', job.id, job.kind, job.attempts)
+    else:
+        job.status = 'done'
+        job.last_error = None
+    db.session.commit()
+
+
+def requeue_abandoned(timeout):
+    """Return jobs stuck in running (worker crashed mid-job) to the queue."""
+    result = db.session.execute(
+        update(job_table)
+        .where(job_table.c.status == 'running',
+               job_table.c.updated_at < datetime.utcnow() - timedelta(seconds=timeout))
+        .values(status='pending', updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def run_pending(limit=None, stop=None):
+    """Process due jobs until the queue is empty or ``stop`` is set; returns how many ran."""
+    processed = 0
+    while (limit is None or processed < limit) and not (stop and stop.is_set()):
+        job_id = (db.session.query(Job.id)
+                  .filter(Job.status == 'pending', Job.run_at <= datetime.utcnow())
+                  .order_by(Job.run_at, Job.id)
+                  .limit(1)
+                  .scalar())
+        db.session.rollback()
+        if job_id is None:
+            break
+        if claim(job_id):
+            execute(db.session.get(Job, job_id))
+            processed += 1
+    return processed
+
+
+def run_worker(poll_interval=1.0, timeout=600, once=False, stop=None):
+    """Worker loop behind ``flask run-worker``; ``once`` drains the queue and returns.
+
+    Setting the ``stop`` event ends the loop once the running job finishes.
+    """
+    last_requeue = 0
+    while not (stop and stop.is_set()):
+        if time.monotonic() - last_requeue > timeout / 2:
+            requeue_abandoned(timeout)
+            last_requeue = time.monotonic()
+        processed = run_pending(stop=stop)
+        db.session.remove()
+        if once:
+            return processed
+        if not processed:
+            if stop:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+
+_worker_thread = None
+_worker_stop = threading.Event()
+
+
+def start_worker_thread(app):
+    """Run the worker loop in a daemon thread of this process (``JOBS_IN_WEB``).
+
+    Used by gunicorn.conf.py in every web worker, but only the process
+    holding an exclusive lock on ``JOBS_LOCK_FILE`` polls the queue; the
+    others just retry the lock, so an idle site runs one poller, and a new
+    one takes over within ``JOB_POLL_INTERVAL`` when its worker exits. The
+    loop restarts after an error (e.g. the database going away).
+    """
+    global _worker_thread
+
+    def run():
+        lock_path = app.config['JOBS_LOCK_FILE']
+        os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+        with open(lock_path, 'a') as lock_file:
+            while not _worker_stop.is_set():
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    _worker_stop.wait(app.config['JOB_POLL_INTERVAL'])
+                    continue
+                try:
+                    with app.app_context():
+                        run_worker(poll_interval=app.config['JOB_POLL_INTERVAL'], timeout=app.config['JOB_TIMEOUT'],
+                                   stop=_worker_stop)
+                except Exception:
+                    logger.exception('Job worker loop stopped, restarting')
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                _worker_stop.wait(app.config['JOB_POLL_INTERVAL'])
+
+    _worker_stop.clear()
+    _worker_thread = threading.Thread(target=run, name='job-worker', daemon=True)
+    _worker_thread.start()
+    return _worker_thread
+
+
+def stop_worker_thread(timeout=None):
+    """Stop the loop started by ``start_worker_thread`` after its current job; False if it is still running."""
+    _worker_stop.set()
+    if _worker_thread is None:
+        return True
+    _worker_thread.join(timeout)
+    return not _worker_thread.is_alive()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_eager_jobs(session):
+    # Jobs flushed in a rolled back transaction never existed.
+    session.info.pop('eager_jobs', None)
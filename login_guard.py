@@ -0,0 +1,222 @@
+import math
+import secrets
+import threading
+import time
+
+from flask import request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db
+
+try:
+    import redis
+except ImportError:  # optional: only needed for LOGIN_THROTTLE_BACKEND = 'redis'
+    redis = None
+
+
+class MemoryBucketBackend:
+    """Token buckets in this process; each worker process limits on its own."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._marks = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take one token; returns 0, or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (capacity, now, capacity, rate))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, capacity, rate)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def mark(self, key, ttl):
+        """Remember ``key`` for ``ttl`` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            self._marks[key] = now + ttl
+            if len(self._marks) > self.max_keys:
+                for marked, expires in list(self._marks.items()):
+                    if expires <= now:
+                        del self._marks[marked]
+                if len(self._marks) > self.max_keys:
+                    for marked, _ in sorted(self._marks.items(), key=lambda item: item[1])[:len(self._marks) // 2]:
+                        del self._marks[marked]
+
+    def is_marked(self, key):
+        return self._marks.get(key, 0) > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._marks.clear()
+
+    def _prune(self, now):
+        # A bucket that has refilled is the same as no bucket at all.
+        for key, (tokens, updated, capacity, rate) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= capacity:
+                del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            for key, _ in sorted(self._buckets.items(), key=lambda item: item[1][1])[:len(self._buckets) // 2]:
+                del self._buckets[key]
+
+
+# Refill, take and store in one step, so concurrent workers cannot both take the last token.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketBackend:
+    """Token buckets in Redis, shared by every worker process and instance."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('LOGIN_THROTTLE_BACKEND = "redis" needs the redis package')
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._take(keys=[f'login-bucket:{key}'], args=[capacity, rate, time.time()]))
+
+    def reset(self, key):
+        self.client.delete(f'login-bucket:{key}')
+
+    def mark(self, key, ttl):
+        self.client.set(f'login-mark:{key}', 1, ex=max(1, int(ttl)))
+
+    def is_marked(self, key):
+        return bool(self.client.exists(f'login-mark:{key}'))
+
+    def clear(self):
+        for pattern in ('login-bucket:*', 'login-mark:*'):
+            for key in self.client.scan_iter(pattern):
+                self.client.delete(key)
+
+
+class LoginGuard:
+    """Keeps login attempts from tying up workers on password hashing.
+
+    Every attempt takes a token from the client IP's bucket, then the
+    account's, then a global one, each only once the previous one allowed
+    it; when one is empty the form is refused with 429 before any hash is
+    computed. Limits are ``(attempts, seconds)`` pairs: that many attempts
+    in a burst, refilled evenly over the period. An IP the account logged
+    in from within ``trusted_ttl`` seconds gets an account bucket of its
+    own, so guessing at an account from elsewhere does not lock its owner
+    out. The global bucket caps the hashing CPU logins can take from the
+    rest of the site. With the memory backend the limits apply per worker
+    process.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.limits = {'ip': (10, 60), 'account': (5, 300), 'global': (600, 60)}
+        self.trusted_ttl = 30 * 24 * 3600
+        self.hash_method = 'pbkdf2:sha256:600000'
+        self.backend = MemoryBucketBackend()
+        self._dummy_hashes = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_THROTTLE_ENABLED', self.enabled)
+        self.limits = {
+            'ip': app.config.get('LOGIN_THROTTLE_IP', self.limits['ip']),
+            'account': app.config.get('LOGIN_THROTTLE_ACCOUNT', self.limits['account']),
+            'global': app.config.get('LOGIN_THROTTLE_GLOBAL', self.limits['global']),
+        }
+        self.trusted_ttl = app.config.get('LOGIN_THROTTLE_TRUSTED_TTL', self.trusted_ttl)
+        self.hash_method = app.config.get('PASSWORD_HASH_METHOD', self.hash_method)
+        if app.config.get('LOGIN_THROTTLE_BACKEND', 'memory') == 'redis':
+            self.backend = RedisBucketBackend(app.config['LOGIN_THROTTLE_URL'])
+        else:
+            self.backend = MemoryBucketBackend()
+        app.extensions['login_guard'] = self
+
+    def throttle(self, account):
+        """Count a login attempt for ``account``; returns 0, or the seconds to wait before retrying."""
+        if not self.enabled:
+            return 0
+        ip = request.remote_addr or 'unknown'
+        account = account.strip().lower()
+        # The client's own bucket first: a single noisy client does not use
+        # up the tokens of the account it targets or of everybody else.
+        wait = self._take('ip', ip)
+        if not wait:
+            trusted = self.trusted_ttl and self.backend.is_marked(f'trusted:{account} {ip}')
+            wait = self._take('account', f'{account} {ip}' if trusted else account)
+        if not wait:
+            wait = self._take('global', '')
+        return math.ceil(wait)
+
+    def reset(self, account):
+        """Refill the buckets of ``account`` after it logged in successfully, and trust the client's IP."""
+        ip = request.remote_addr or 'unknown'
+        account = account.strip().lower()
+        self.backend.reset(f'account:{account}')
+        self.backend.reset(f'account:{account} {ip}')
+        if self.trusted_ttl:
+            self.backend.mark(f'trusted:{account} {ip}', self.trusted_ttl)
+
+    def _take(self, scope, key):
+        limit = self.limits[scope]
+        if not limit:
+            return 0
+        attempts, period = limit
+        return self.backend.take(f'{scope}:{key}', attempts, attempts / period)
+
+    def verify_password(self, user, password):
+        """Check ``password`` against ``user``, ``None`` when no account matched.
+
+        Unknown accounts are checked against a dummy hash of the same method,
+        so the response time does not tell whether an email is registered.
+        A hash made with another method or cost than ``PASSWORD_HASH_METHOD``
+        is replaced once the password is known to be right.
+        """
+        if user is None:
+            check_password_hash(self._dummy_hash(), password)
+            return False
+        if not user.check_password(password):
+            return False
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+        return True
+
+    def _dummy_hash(self):
+        # Made on first use: hashing at startup would slow down every worker boot.
+        dummy = self._dummy_hashes.get(self.hash_method)
+        if dummy is None:
+            dummy = self._dummy_hashes[self.hash_method] = generate_password_hash(secrets.token_hex(16),
+                                                                                  method=self.hash_method)
+        return dummy
+
+
+login_guard = LoginGuard()
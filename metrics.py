@@ -0,0 +1,238 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, delete, event, func, inspect, insert, select, update
+
+from cache_invalidation import CommitInvalidation
+from models import db, Pharmacy, Product, Order, Subscription, OrderDailyMetrics
+
+daily_table = OrderDailyMetrics.__table__
+
+
+class MetricsCache:
+    """Per-process snapshot of dashboard counters.
+
+    Each snapshot is computed with a single query and reused until it
+    expires or a commit touches the rows it counts. ``METRICS_CACHE_TTL``
+    bounds how stale other worker processes can be.
+    """
+
+    def __init__(self, ttl=300, low_stock_threshold=10):
+        self.ttl = ttl
+        self.low_stock_threshold = low_stock_threshold
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('METRICS_CACHE_TTL', self.ttl)
+        self.low_stock_threshold = app.config.get('LOW_STOCK_THRESHOLD', self.low_stock_threshold)
+        app.extensions['metrics_cache'] = self
+
+    def get(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+metrics_cache = MetricsCache()
+
+# Counter snapshots are dropped once the commit that changed their rows lands.
+stale_metrics = CommitInvalidation('metrics', metrics_cache.invalidate)
+
+
+def platform_metrics():
+    """Return the server admin counters as a dict."""
+    def compute():
+        total, active, pending = db.session.query(
+            select(func.count(Pharmacy.id)).scalar_subquery(),
+            select(func.count(Pharmacy.id)).where(Pharmacy.is_active == True).scalar_subquery(),
+            select(func.count(Subscription.id)).where(Subscription.status == 'pending').scalar_subquery(),
+        ).one()
+        return {
+            'total_pharmacies': total,
+            'active_pharmacies': active,
+            'pending_subscriptions': pending,
+        }
+
+    return metrics_cache.get('platform', compute)
+
+
+def subscription_metrics():
+    """Return subscription counts per status and the active monthly revenue as a dict."""
+    def compute():
+        rows = (db.session.query(Subscription.status,
+                                 func.count(Subscription.id),
+                                 func.coalesce(func.sum(Subscription.amount), 0))
+                .group_by(Subscription.status))
+        counts = {}
+        active_revenue = 0
+        for status, count, amount in rows:
+            counts[status] = count
+            if status == 'active':
+                active_revenue = amount
+        return {
+            'subscription_counts': counts,
+            'active_revenue': active_revenue,
+        }
+
+    return metrics_cache.get('subscriptions', compute)
+
+
+def product_metrics(pharmacy_id):
+    """Return product counters for one pharmacy as a dict."""
+    def compute():
+        threshold = metrics_cache.low_stock_threshold
+        total, in_stock, low_stock = db.session.query(
+            func.count(Product.id),
+            func.coalesce(func.sum(case((Product.stock_quantity > 0, 1), else_=0)), 0),
+            func.coalesce(func.sum(case(((Product.stock_quantity > 0) & (Product.stock_quantity <= threshold), 1),
+                                        else_=0)), 0),
+        ).filter(Product.pharmacy_id == pharmacy_id).one()
+        return {
+            'total_products': total,
+            'products_in_stock': in_stock,
+            'low_stock_products': low_stock,
+        }
+
+    return metrics_cache.get(('products', pharmacy_id), compute)
+
+
+def revenue_series(pharmacy_id=None, days=30):
+    """Return ``[{'day', 'orders', 'revenue'}, ...]`` for the last ``days`` days.
+
+    Reads the daily buckets only, never the order table. Without a
+    ``pharmacy_id`` the buckets of every pharmacy are summed.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    query = (db.session.query(OrderDailyMetrics.day,
+                              func.sum(OrderDailyMetrics.order_count),
+                              func.sum(OrderDailyMetrics.revenue))
+             .filter(OrderDailyMetrics.day >= since)
+             .group_by(OrderDailyMetrics.day))
+    if pharmacy_id is not None:
+        query = query.filter(OrderDailyMetrics.pharmacy_id == pharmacy_id)
+    buckets = {day: (orders, revenue) for day, orders, revenue in query}
+
+    series = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        orders, revenue = buckets.get(day, (0, 0))
+        series.append({'day': day, 'orders': orders or 0, 'revenue': revenue or 0})
+    return series
+
+
+def rebuild_daily_metrics(since=None):
+    """Recompute the daily buckets from the order table.
+
+    Meant for the periodic ``flask refresh-metrics`` job, which backfills
+    history and corrects any drift from writes that bypassed the ORM.
+    """
+    day = func.date(Order.created_at)
+    query = (db.session.query(Order.pharmacy_id, day, func.count(Order.id), func.sum(Order.total_amount))
+             .group_by(Order.pharmacy_id, day))
+    cleanup = delete(daily_table)
+    if since is not None:
+        query = query.filter(Order.created_at >= datetime.combine(since, datetime.min.time()))
+        cleanup = cleanup.where(daily_table.c.day >= since)
+
+    rows = [{'pharmacy_id': pharmacy_id,
+             'day': bucket if isinstance(bucket, date) else date.fromisoformat(bucket),
+             'order_count': orders,
+             'revenue': revenue or 0}
+            for pharmacy_id, bucket, orders, revenue in query]
+
+    db.session.execute(cleanup)
+    if rows:
+        db.session.execute(insert(daily_table), rows)
+    db.session.commit()
+    metrics_cache.clear()
+    return len(rows)
+
+
+def _add_to_bucket(connection, pharmacy_id, created_at, orders, revenue):
+    if not (orders or revenue):
+        return
+    day = (created_at or datetime.utcnow()).date()
+    values = {'pharmacy_id': pharmacy_id, 'day': day, 'order_count': orders, 'revenue': revenue}
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        statement = upsert(daily_table).values(**values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[daily_table.c.pharmacy_id, daily_table.c.day],
+            set_={'order_count': daily_table.c.order_count + statement.excluded.order_count,
+                  'revenue': daily_table.c.revenue + statement.excluded.revenue},
+        ))
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as upsert
+        statement = upsert(daily_table).values(**values)
+        connection.execute(statement.on_duplicate_key_update(
+            order_count=daily_table.c.order_count + statement.inserted.order_count,
+            revenue=daily_table.c.revenue + statement.inserted.revenue,
+        ))
+    else:
+        result = connection.execute(
+            update(daily_table)
+            .where((daily_table.c.pharmacy_id == pharmacy_id) & (daily_table.c.day == day))
+            .values(order_count=daily_table.c.order_count + orders,
+                    revenue=daily_table.c.revenue + revenue)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(daily_table).values(**values))
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, order):
+    _add_to_bucket(connection, order.pharmacy_id, order.created_at, 1, order.total_amount or 0)
+
+
+@event.listens_for(Order, 'after_update')
+def _order_updated(mapper, connection, order):
+    total = inspect(order).attrs.total_amount.history
+    if total.has_changes():
+        revenue = sum(value or 0 for value in total.added) - sum(value or 0 for value in total.deleted)
+        _add_to_bucket(connection, order.pharmacy_id, order.created_at, 0, revenue)
+
+
+@event.listens_for(Order, 'after_delete')
+def _order_deleted(mapper, connection, order):
+    _add_to_bucket(connection, order.pharmacy_id, order.created_at, -1, -(order.total_amount or 0))
+
+
+def _mark_platform_stale(mapper, connection, target):
+    stale_metrics.mark_for(target, 'platform')
+
+
+def _mark_subscriptions_stale(mapper, connection, target):
+    stale_metrics.mark_for(target, 'platform', 'subscriptions')
+
+
+def _mark_products_stale(mapper, connection, target):
+    stale_metrics.mark_for(target, ('products', target.pharmacy_id))
+
+
+for _model, _listener in ((Pharmacy, _mark_platform_stale),
+                          (Subscription, _mark_subscriptions_stale),
+                          (Product, _mark_products_stale)):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _listener)
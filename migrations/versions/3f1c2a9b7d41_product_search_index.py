@@ -0,0 +1,70 @@
+"""product full-text search index
+
+Revision ID: 3f1c2a9b7d41
+Revises: 
+Create Date: 2026-10-17 10:12:03.418211
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Frozen copy of search.SEARCH_DOCUMENT_SQL and its DDL, so this revision keeps
+# building the same index whatever search.py becomes. The two must stay in sync:
+# PostgreSQL only uses the expression index when the query repeats it exactly,
+# so changing the document in search.py needs a new revision that rebuilds it.
+SEARCH_DOCUMENT_SQL = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' "
+    "|| coalesce(category, '') || ' ' || coalesce(sku, ''))"
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_product_search_document ON product USING gin ({SEARCH_DOCUMENT_SQL})")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_product_name_trgm ON product USING gin (name gin_trgm_ops)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_product_sku_trgm ON product USING gin (sku gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+            "name, description, category, sku, content='product', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+            "INSERT INTO product_fts(rowid, name, description, category, sku) "
+            "VALUES (new.id, new.name, new.description, new.category, new.sku); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+            "INSERT INTO product_fts(product_fts, rowid, name, description, category, sku) "
+            "VALUES ('delete', old.id, old.name, old.description, old.category, old.sku); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE ON product BEGIN "
+            "INSERT INTO product_fts(product_fts, rowid, name, description, category, sku) "
+            "VALUES ('delete', old.id, old.name, old.description, old.category, old.sku); "
+            "INSERT INTO product_fts(rowid, name, description, category, sku) "
+            "VALUES (new.id, new.name, new.description, new.category, new.sku); END"
+        )
+        op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_product_sku_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_product_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_product_search_document")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS product_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS product_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS product_fts_ai")
+        op.execute("DROP TABLE IF EXISTS product_fts")
@@ -0,0 +1,43 @@
+"""multi-tenant composite indexes
+
+Revision ID: 8b2e61d4c9a0
+Revises: 3f1c2a9b7d41
+Create Date: 2026-10-17 11:40:27.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e61d4c9a0'
+down_revision = '3f1c2a9b7d41'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_product_pharmacy_active_category_price', 'product', ['pharmacy_id', 'is_active', 'category', 'price']),
+    ('ix_product_pharmacy_name', 'product', ['pharmacy_id', 'name', 'id']),
+    ('ix_order_pharmacy_created_at', 'order', ['pharmacy_id', 'created_at']),
+    ('ix_order_pharmacy_status', 'order', ['pharmacy_id', 'status']),
+    ('ix_order_item_order_id', 'order_item', ['order_id']),
+    ('ix_inventory_movement_product_created_at', 'inventory_movement', ['product_id', 'created_at']),
+    ('ix_audit_log_table_record', 'audit_log', ['table_name', 'record_id']),
+]
+
+
+def _existing_indexes(table_name):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table_name)}
+
+
+def upgrade():
+    # Databases bootstrapped with db.create_all() already have these indexes.
+    for name, table_name, columns in INDEXES:
+        if name not in _existing_indexes(table_name):
+            op.create_index(name, table_name, columns, unique=False)
+
+
+def downgrade():
+    for name, table_name, columns in reversed(INDEXES):
+        if name in _existing_indexes(table_name):
+            op.drop_index(name, table_name=table_name)
@@ -0,0 +1,42 @@
+"""job queue
+
+Revision ID: a6d3e8f51c27
+Revises: f2b7c91a4e03
+Create Date: 2026-10-17 18:11:42.906315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3e8f51c27'
+down_revision = 'f2b7c91a4e03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('pharmacy_id', sa.Integer(), nullable=True),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacy.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_status_run_at', 'job', ['status', 'run_at'], unique=False)
+    op.create_index('ix_job_pharmacy_created_at', 'job', ['pharmacy_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_pharmacy_created_at', table_name='job')
+    op.drop_index('ix_job_status_run_at', table_name='job')
+    op.drop_table('job')
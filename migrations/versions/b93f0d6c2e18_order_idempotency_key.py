@@ -0,0 +1,28 @@
+"""order idempotency key
+
+Revision ID: b93f0d6c2e18
+Revises: a6d3e8f51c27
+Create Date: 2026-10-17 19:02:37.448120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b93f0d6c2e18'
+down_revision = 'a6d3e8f51c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_order_pharmacy_idempotency_key', ['pharmacy_id', 'idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_order_pharmacy_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
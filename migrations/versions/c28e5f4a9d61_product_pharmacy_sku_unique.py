@@ -0,0 +1,44 @@
+"""product pharmacy sku unique
+
+Revision ID: c28e5f4a9d61
+Revises: b93f0d6c2e18
+Create Date: 2026-10-17 19:48:05.317254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c28e5f4a9d61'
+down_revision = 'b93f0d6c2e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bulk import upserts on (pharmacy_id, sku). Products without SKU are not
+    # affected; duplicated SKUs within a pharmacy must be fixed before upgrading.
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT pharmacy_id, sku, COUNT(*) FROM product "
+        "WHERE sku IS NOT NULL GROUP BY pharmacy_id, sku HAVING COUNT(*) > 1 "
+        "ORDER BY pharmacy_id, sku"
+    )).fetchall()
+    if duplicates:
+        listing = '\n'.join(f'  pharmacy_id={pharmacy_id} sku={sku!r}: {count} products'
+                             for pharmacy_id, sku, count in duplicates[:50])
+        if len(duplicates) > 50:
+            listing += f'\n  ... and {len(duplicates) - 50} more'
+        raise RuntimeError(
+            f'Cannot add uq_product_pharmacy_sku: {len(duplicates)} SKUs are used by more than one '
+            f'product of the same pharmacy. Rename or clear the SKU of the extra products and upgrade '
+            f'again:\n{listing}'
+        )
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_product_pharmacy_sku', ['pharmacy_id', 'sku'])
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_product_pharmacy_sku', type_='unique')
@@ -0,0 +1,51 @@
+"""pharmacy order stats
+
+Revision ID: c4a9e07f12b3
+Revises: 8b2e61d4c9a0
+Create Date: 2026-10-17 13:05:48.227530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e07f12b3'
+down_revision = '8b2e61d4c9a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pharmacy_order_stats',
+    sa.Column('pharmacy_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('pending_count', sa.Integer(), nullable=False),
+    sa.Column('completed_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacy.id'], ),
+    sa.PrimaryKeyConstraint('pharmacy_id')
+    )
+
+    # Backfill from the order table; afterwards the Order mapper events keep
+    # the rows current and `flask rebuild-order-stats` corrects any drift.
+    order = sa.table('order', sa.column('pharmacy_id'), sa.column('id'), sa.column('status'),
+                     sa.column('total_amount'))
+    stats = sa.table('pharmacy_order_stats', sa.column('pharmacy_id'), sa.column('order_count'),
+                     sa.column('pending_count'), sa.column('completed_count'), sa.column('revenue'),
+                     sa.column('updated_at'))
+    op.execute(stats.insert().from_select(
+        ['pharmacy_id', 'order_count', 'pending_count', 'completed_count', 'revenue', 'updated_at'],
+        sa.select(order.c.pharmacy_id,
+                  sa.func.count(order.c.id),
+                  sa.func.coalesce(sa.func.sum(sa.case((order.c.status == 'pending', 1), else_=0)), 0),
+                  sa.func.coalesce(sa.func.sum(sa.case((order.c.status == 'completed', 1), else_=0)), 0),
+                  sa.func.coalesce(sa.func.sum(order.c.total_amount), 0),
+                  sa.func.current_timestamp())
+        .group_by(order.c.pharmacy_id)
+    ))
+
+
+def downgrade():
+    op.drop_table('pharmacy_order_stats')
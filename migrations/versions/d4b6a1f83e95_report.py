@@ -0,0 +1,41 @@
+"""report
+
+Revision ID: d4b6a1f83e95
+Revises: c28e5f4a9d61
+Create Date: 2026-10-17 20:31:18.660473
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b6a1f83e95'
+down_revision = 'c28e5f4a9d61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pharmacy_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('format', sa.String(length=10), nullable=False),
+    sa.Column('date_from', sa.Date(), nullable=True),
+    sa.Column('date_to', sa.Date(), nullable=True),
+    sa.Column('job_id', sa.Integer(), nullable=True),
+    sa.Column('file_path', sa.String(length=255), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['job.id'], ),
+    sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacy.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_report_pharmacy_created_at', 'report', ['pharmacy_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_report_pharmacy_created_at', table_name='report')
+    op.drop_table('report')
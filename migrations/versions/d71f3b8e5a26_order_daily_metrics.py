@@ -0,0 +1,34 @@
+"""order daily metrics
+
+Revision ID: d71f3b8e5a26
+Revises: c4a9e07f12b3
+Create Date: 2026-10-17 14:22:10.561902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71f3b8e5a26'
+down_revision = 'c4a9e07f12b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill existing history with `flask refresh-metrics`.
+    op.create_table('order_daily_metrics',
+    sa.Column('pharmacy_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacy.id'], ),
+    sa.PrimaryKeyConstraint('pharmacy_id', 'day')
+    )
+    op.create_index('ix_order_daily_metrics_day', 'order_daily_metrics', ['day'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_order_daily_metrics_day', table_name='order_daily_metrics')
+    op.drop_table('order_daily_metrics')
@@ -0,0 +1,42 @@
+"""server side carts
+
+Revision ID: e1c7a9b02f46
+Revises: d4b6a1f83e95
+Create Date: 2026-10-17 21:14:52.073981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1c7a9b02f46'
+down_revision = 'd4b6a1f83e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cart',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_cart_updated_at', 'cart', ['updated_at'], unique=False)
+    op.create_table('cart_line',
+    sa.Column('cart_id', sa.String(length=32), nullable=False),
+    sa.Column('pharmacy_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['cart_id'], ['cart.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacy.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('cart_id', 'pharmacy_id', 'product_id')
+    )
+
+
+def downgrade():
+    op.drop_table('cart_line')
+    op.drop_index('ix_cart_updated_at', table_name='cart')
+    op.drop_table('cart')
@@ -0,0 +1,35 @@
+"""product sync tombstones
+
+Revision ID: e58a2c7d0f14
+Revises: d71f3b8e5a26
+Create Date: 2026-10-17 15:48:31.774019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e58a2c7d0f14'
+down_revision = 'd71f3b8e5a26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('pharmacy_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacy.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_product_tombstone_pharmacy_id', 'product_tombstone', ['pharmacy_id', 'id'], unique=False)
+    op.create_index('ix_product_pharmacy_updated_at', 'product', ['pharmacy_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_pharmacy_updated_at', table_name='product')
+    op.drop_index('ix_product_tombstone_pharmacy_id', table_name='product_tombstone')
+    op.drop_table('product_tombstone')
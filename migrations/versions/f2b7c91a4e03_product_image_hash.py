@@ -0,0 +1,28 @@
+"""product image hash
+
+Revision ID: f2b7c91a4e03
+Revises: e58a2c7d0f14
+Create Date: 2026-10-17 17:03:56.120447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c91a4e03'
+down_revision = 'e58a2c7d0f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_product_image_hash', ['image_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_image_hash')
+        batch_op.drop_column('image_hash')
@@ -1,3 +1,4 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
@@ -5,6 +6,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# Processed product images live under UPLOAD_FOLDER/products, named by content hash
+PRODUCT_IMAGE_URL = '/static/uploads/products/{image_hash}-{variant}.{fmt}'
+
 class User(UserMixin, db.Model):
     """User model for all types of users"""
     id = db.Column(db.Integer, primary_key=True)
@@ -20,11 +24,15 @@ class User(UserMixin, db.Model):
     pharmacy = db.relationship('Pharmacy', backref='admin_user', uselist=False)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def password_needs_rehash(self):
+        """True when the stored hash was made with another method or cost than PASSWORD_HASH_METHOD."""
+        return self.password_hash.split('$', 1)[0] != current_app.config['PASSWORD_HASH_METHOD']
+    
     def __repr__(self):
         return f'<User {self.email}>'
 
@@ -54,6 +62,14 @@ class Pharmacy(db.Model):
 
 class Product(db.Model):
     """Product model"""
+    __table_args__ = (
+        db.Index('ix_product_pharmacy_active_category_price', 'pharmacy_id', 'is_active', 'category', 'price'),
+        db.Index('ix_product_pharmacy_name', 'pharmacy_id', 'name', 'id'),
+        db.Index('ix_product_pharmacy_updated_at', 'pharmacy_id', 'updated_at', 'id'),
+        db.Index('ix_product_image_hash', 'image_hash'),
+        db.UniqueConstraint('pharmacy_id', 'sku', name='uq_product_pharmacy_sku'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -61,6 +77,7 @@ class Product(db.Model):
     stock_quantity = db.Column(db.Integer, default=0)
     category = db.Column(db.String(50))
     image_url = db.Column(db.String(255))
+    image_hash = db.Column(db.String(64))  # Content hash of the processed image variants
     sku = db.Column(db.String(50))  # Stock Keeping Unit
     is_active = db.Column(db.Boolean, default=True)
     pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), nullable=False)
@@ -70,11 +87,37 @@ class Product(db.Model):
     # Relationships
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     
+    def image_variant_url(self, variant='card', fmt='webp'):
+        """URL of a resized image variant (thumb, card, detail), or the legacy image_url."""
+        if self.image_hash:
+            return PRODUCT_IMAGE_URL.format(image_hash=self.image_hash, variant=variant, fmt=fmt)
+        return self.image_url
+    
     def __repr__(self):
         return f'<Product {self.name}>'
 
+class ProductTombstone(db.Model):
+    """Record of a deleted product, kept for incremental catalog sync"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_product_tombstone_pharmacy_id', 'pharmacy_id', 'id'),
+    )
+    
+    def __repr__(self):
+        return f'<ProductTombstone {self.product_id}>'
+
 class Order(db.Model):
     """Order model"""
+    __table_args__ = (
+        db.Index('ix_order_pharmacy_created_at', 'pharmacy_id', 'created_at'),
+        db.Index('ix_order_pharmacy_status', 'pharmacy_id', 'status'),
+        db.UniqueConstraint('pharmacy_id', 'idempotency_key', name='uq_order_pharmacy_idempotency_key'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(20), unique=True, nullable=False)
     customer_name = db.Column(db.String(100), nullable=False)
@@ -85,6 +128,7 @@ class Order(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, confirmed, processing, shipped, delivered, cancelled
     payment_status = db.Column(db.String(20), default='pending')  # pending, paid, failed, refunded
     pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), nullable=False)
+    idempotency_key = db.Column(db.String(64))  # Sent by the client so a resubmitted checkout returns the same order
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -94,8 +138,38 @@ class Order(db.Model):
     def __repr__(self):
         return f'<Order {self.order_number}>'
 
+class PharmacyOrderStats(db.Model):
+    """Running order totals per pharmacy, maintained by order_stats"""
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PharmacyOrderStats {self.pharmacy_id}>'
+
+class OrderDailyMetrics(db.Model):
+    """Orders and revenue per pharmacy and day, maintained by metrics"""
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_order_daily_metrics_day', 'day'),
+    )
+    
+    def __repr__(self):
+        return f'<OrderDailyMetrics {self.pharmacy_id} {self.day}>'
+
 class OrderItem(db.Model):
     """Order item model"""
+    __table_args__ = (
+        db.Index('ix_order_item_order_id', 'order_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -124,6 +198,10 @@ class Subscription(db.Model):
 
 class InventoryMovement(db.Model):
     """Inventory movement tracking"""
+    __table_args__ = (
+        db.Index('ix_inventory_movement_product_created_at', 'product_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     movement_type = db.Column(db.String(20), nullable=False)  # in, out, adjustment
@@ -140,6 +218,71 @@ class InventoryMovement(db.Model):
     def __repr__(self):
         return f'<InventoryMovement {self.id}>'
 
+class Cart(db.Model):
+    """Server-side shopping cart; the browser session only keeps its id"""
+    id = db.Column(db.String(32), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<Cart {self.id}>'
+
+class CartLine(db.Model):
+    """Quantity of one product in a cart, per pharmacy"""
+    cart_id = db.Column(db.String(32), db.ForeignKey('cart.id', ondelete='CASCADE'), primary_key=True)
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<CartLine {self.cart_id} {self.product_id}>'
+
+class Job(db.Model):
+    """Background job processed by the worker (flask run-worker)"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text)  # JSON string
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text)
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'))
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+        db.Index('ix_job_pharmacy_created_at', 'pharmacy_id', 'created_at'),
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.kind} {self.status}>'
+
+class Report(db.Model):
+    """Report file generated in the background for a pharmacy"""
+    id = db.Column(db.Integer, primary_key=True)
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacy.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # sales, orders, inventory
+    format = db.Column(db.String(10), nullable=False)  # xlsx, pdf
+    date_from = db.Column(db.Date)
+    date_to = db.Column(db.Date)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'))
+    file_path = db.Column(db.String(255))  # Set once the file is ready
+    row_count = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_report_pharmacy_created_at', 'pharmacy_id', 'created_at'),
+    )
+    
+    # Relationships
+    job = db.relationship('Job')
+    
+    def __repr__(self):
+        return f'<Report {self.kind} {self.format}>'
+
 class Category(db.Model):
     """Product categories"""
     id = db.Column(db.Integer, primary_key=True)
@@ -153,6 +296,10 @@ class Category(db.Model):
 
 class AuditLog(db.Model):
     """Audit log for system activities"""
+    __table_args__ = (
+        db.Index('ix_audit_log_table_record', 'table_name', 'record_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     action = db.Column(db.String(100), nullable=False)
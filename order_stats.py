@@ -0,0 +1,139 @@
+from datetime import datetime
+
+from sqlalchemy import case, delete, event, func, insert, inspect, update
+
+from models import db, Order, PharmacyOrderStats
+
+stats_table = PharmacyOrderStats.__table__
+
+
+def get_order_stats(pharmacy_id):
+    """Return the ``PharmacyOrderStats`` row for ``pharmacy_id``.
+
+    The row is kept current by the Order mapper events below and created by
+    the first order of a pharmacy; one without orders gets an unsaved row of
+    zeros. Reading never writes: rows for orders placed before the table
+    existed come from the migration or ``flask rebuild-order-stats``.
+    """
+    stats = db.session.get(PharmacyOrderStats, pharmacy_id)
+    if stats is None:
+        stats = PharmacyOrderStats(pharmacy_id=pharmacy_id, order_count=0, pending_count=0, completed_count=0,
+                                   revenue=0)
+    return stats
+
+
+def rebuild_order_stats():
+    """Recompute every pharmacy's row from the order table.
+
+    Meant for ``flask rebuild-order-stats``, which backfills pharmacies and
+    corrects any drift from writes that bypassed the ORM.
+    """
+    query = (db.session.query(Order.pharmacy_id,
+                              func.count(Order.id),
+                              func.coalesce(func.sum(case((Order.status == 'pending', 1), else_=0)), 0),
+                              func.coalesce(func.sum(case((Order.status == 'completed', 1), else_=0)), 0),
+                              func.coalesce(func.sum(Order.total_amount), 0))
+             .group_by(Order.pharmacy_id))
+    now = datetime.utcnow()
+    rows = [{'pharmacy_id': pharmacy_id,
+             'order_count': orders,
+             'pending_count': pending,
+             'completed_count': completed,
+             'revenue': revenue,
+             'updated_at': now}
+            for pharmacy_id, orders, pending, completed, revenue in query]
+
+    db.session.execute(delete(stats_table))
+    if rows:
+        db.session.execute(insert(stats_table), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def _apply(connection, pharmacy_id, orders=0, pending=0, completed=0, revenue=0):
+    if not (orders or pending or completed or revenue):
+        return
+    values = {'pharmacy_id': pharmacy_id, 'order_count': orders, 'pending_count': pending,
+              'completed_count': completed, 'revenue': revenue, 'updated_at': datetime.utcnow()}
+    increments = {column: stats_table.c[column] + values[column]
+                  for column in ('order_count', 'pending_count', 'completed_count', 'revenue')}
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        statement = upsert(stats_table).values(**values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[stats_table.c.pharmacy_id],
+            set_=dict(increments, updated_at=statement.excluded.updated_at),
+        ))
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as upsert
+        statement = upsert(stats_table).values(**values)
+        connection.execute(statement.on_duplicate_key_update(**increments, updated_at=statement.inserted.updated_at))
+    else:
+        result = connection.execute(
+            update(stats_table)
+            .where(stats_table.c.pharmacy_id == pharmacy_id)
+            .values(**increments, updated_at=values['updated_at'])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(stats_table).values(**values))
+
+
+def _status_delta(status, sign):
+    return {
+        'pending': sign if status == 'pending' else 0,
+        'completed': sign if status == 'completed' else 0,
+    }
+
+
+# The deltas run on the flushing connection, so they commit or roll back
+# together with the order itself. The first order of a pharmacy inserts its
+# row; pharmacies with earlier orders are backfilled by the migration.
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, order):
+    _apply(connection, order.pharmacy_id, orders=1,
+           revenue=order.total_amount or 0, **_status_delta(order.status, 1))
+
+
+@event.listens_for(Order.status, 'set', active_history=True)
+@event.listens_for(Order.total_amount, 'set', active_history=True)
+def _load_previous_value(order, value, previous, initiator):
+    # Registering with active_history loads the old value before it is
+    # replaced, so after_update sees it even when the order had expired
+    # (e.g. after a commit) before the assignment.
+    pass
+
+
+@event.listens_for(Order, 'after_update')
+def _order_updated(mapper, connection, order):
+    state = inspect(order)
+    status = state.attrs.status.history
+    total = state.attrs.total_amount.history
+
+    pending = completed = 0
+    if status.has_changes():
+        for old_status in status.deleted:
+            delta = _status_delta(old_status, -1)
+            pending += delta['pending']
+            completed += delta['completed']
+        for new_status in status.added:
+            delta = _status_delta(new_status, 1)
+            pending += delta['pending']
+            completed += delta['completed']
+
+    revenue = 0
+    if total.has_changes():
+        revenue = sum(value or 0 for value in total.added) - sum(value or 0 for value in total.deleted)
+
+    _apply(connection, order.pharmacy_id, pending=pending, completed=completed, revenue=revenue)
+
+
+@event.listens_for(Order, 'after_delete')
+def _order_deleted(mapper, connection, order):
+    _apply(connection, order.pharmacy_id, orders=-1,
+           revenue=-(order.total_amount or 0), **_status_delta(order.status, -1))
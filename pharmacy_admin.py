@@ -0,0 +1,364 @@
+import os
+from datetime import datetime
+
+from flask import (Blueprint, Response, abort, current_app, flash, redirect, render_template, request, send_file,
+                   stream_with_context, url_for)
+from flask_login import current_user, login_required, login_user
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from images import stage_product_image
+from jobs import enqueue
+from login_guard import login_guard
+from metrics import product_metrics, revenue_series
+from models import db, Category, Job, Order, OrderItem, Product, Report, User
+from order_stats import get_order_stats
+from product_io import read_rows, import_products as import_product_rows, export_products_csv, export_products_xlsx
+from query_budget import query_budget
+from reports import REPORTS, FORMATS as REPORT_FORMATS, request_report
+from tenant_cache import get_pharmacy_or_404
+
+pharmacy_admin = Blueprint('pharmacy_admin', __name__, url_prefix='/pharmacy/<slug>/admin')
+
+
+@pharmacy_admin.route('/login', methods=['GET', 'POST'])
+def login(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if request.method == 'POST':
+        email = request.form['email']
+        password = request.form['password']
+
+        wait = login_guard.throttle(email)
+        if wait:
+            flash(f'Demasiados intentos. Intenta de nuevo en {wait} segundos.', 'error')
+            return render_template('pharmacy/admin/login.html', pharmacy=pharmacy), 429, {'Retry-After': str(wait)}
+
+        user = User.query.filter_by(email=email, role='pharmacy_admin').first()
+        if not (user and user.pharmacy and user.pharmacy.slug == slug):
+            # Another pharmacy's admin is checked like an unknown email, at the same cost.
+            user = None
+
+        if login_guard.verify_password(user, password):
+            login_user(user)
+            login_guard.reset(email)
+            return redirect(url_for('pharmacy_admin.dashboard', slug=slug))
+
+        flash('Credenciales inválidas', 'error')
+
+    return render_template('pharmacy/admin/login.html', pharmacy=pharmacy)
+
+
+@pharmacy_admin.route('/dashboard')
+@query_budget(12)
+@login_required
+def dashboard(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    order_stats = get_order_stats(pharmacy.id)
+    series = revenue_series(pharmacy.id, days=30)
+    recent_orders = Order.query.filter_by(pharmacy_id=pharmacy.id).order_by(Order.created_at.desc()).limit(5).all()
+
+    return render_template('pharmacy/admin/dashboard.html',
+                         pharmacy=pharmacy,
+                         total_orders=order_stats.order_count,
+                         pending_orders=order_stats.pending_count,
+                         completed_orders=order_stats.completed_count,
+                         monthly_revenue=sum(day['revenue'] for day in series),
+                         revenue_series=series,
+                         recent_orders=recent_orders,
+                         **product_metrics(pharmacy.id))
+
+
+@pharmacy_admin.route('/products')
+@login_required
+def products(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    products = Product.query.filter_by(pharmacy_id=pharmacy.id).all()
+    return render_template('pharmacy/admin/products.html', pharmacy=pharmacy, products=products)
+
+
+@pharmacy_admin.route('/orders')
+@query_budget(7)
+@login_required
+def orders(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    order_stats = get_order_stats(pharmacy.id)
+    orders = (Order.query.filter_by(pharmacy_id=pharmacy.id)
+              .options(selectinload(Order.items).selectinload(OrderItem.product))
+              .order_by(Order.created_at.desc(), Order.id.desc())
+              .paginate(page=request.args.get('page', 1, type=int),
+                        per_page=current_app.config['POSTS_PER_PAGE'],
+                        error_out=False,
+                        count=False))
+    # The pager counts the table itself (an index-only scan of
+    # ix_order_pharmacy_created_at); order_stats only feeds the summary cards.
+    orders.total = (db.session.query(func.count(Order.id))
+                    .filter(Order.pharmacy_id == pharmacy.id)
+                    .scalar())
+
+    return render_template('pharmacy/admin/orders.html', pharmacy=pharmacy, orders=orders, order_stats=order_stats)
+
+
+@pharmacy_admin.route('/products/add', methods=['GET', 'POST'])
+@login_required
+def add_product(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    if request.method == 'POST':
+        try:
+            name = request.form['name']
+            description = request.form['description']
+            price = float(request.form['price'])
+            stock_quantity = int(request.form['stock_quantity'])
+            category = request.form['category']
+            sku = request.form['sku']
+
+            product = Product(
+                name=name,
+                description=description,
+                price=price,
+                stock_quantity=stock_quantity,
+                category=category,
+                sku=sku,
+                pharmacy_id=pharmacy.id
+            )
+
+            db.session.add(product)
+
+            if 'image' in request.files:
+                file = request.files['image']
+                if file and file.filename != '':
+                    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+                    if '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() in allowed_extensions:
+                        db.session.flush()
+                        stage_product_image(product, file)
+
+            db.session.commit()
+
+            flash('Producto agregado exitosamente!', 'success')
+            return redirect(url_for('pharmacy_admin.products', slug=slug))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error al agregar producto: {str(e)}', 'error')
+
+    categories = Category.query.filter_by(is_active=True).all()
+    return render_template('pharmacy/admin/add_product.html', pharmacy=pharmacy, categories=categories)
+
+
+@pharmacy_admin.route('/products/<int:product_id>/edit', methods=['GET', 'POST'])
+@login_required
+def edit_product(slug, product_id):
+    pharmacy = get_pharmacy_or_404(slug)
+    product = Product.query.filter_by(id=product_id, pharmacy_id=pharmacy.id).first_or_404()
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    if request.method == 'POST':
+        try:
+            product.name = request.form['name']
+            product.description = request.form['description']
+            product.price = float(request.form['price'])
+            product.stock_quantity = int(request.form['stock_quantity'])
+            product.category = request.form['category']
+            product.sku = request.form['sku']
+
+            if 'image' in request.files:
+                file = request.files['image']
+                if file and file.filename != '':
+                    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+                    if '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() in allowed_extensions:
+                        stage_product_image(product, file)
+
+            db.session.commit()
+
+            flash('Producto actualizado exitosamente!', 'success')
+            return redirect(url_for('pharmacy_admin.products', slug=slug))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error al actualizar producto: {str(e)}', 'error')
+
+    categories = Category.query.filter_by(is_active=True).all()
+    return render_template('pharmacy/admin/edit_product.html', pharmacy=pharmacy, product=product, categories=categories)
+
+
+@pharmacy_admin.route('/products/<int:product_id>/delete', methods=['POST'])
+@login_required
+def delete_product(slug, product_id):
+    pharmacy = get_pharmacy_or_404(slug)
+    product = Product.query.filter_by(id=product_id, pharmacy_id=pharmacy.id).first_or_404()
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    try:
+        if product.image_hash or product.image_url:
+            enqueue('release_product_image', pharmacy_id=pharmacy.id,
+                    image_hash=product.image_hash, image_url=product.image_url)
+        db.session.delete(product)
+        db.session.commit()
+        flash('Producto eliminado exitosamente!', 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al eliminar producto: {str(e)}', 'error')
+
+    return redirect(url_for('pharmacy_admin.products', slug=slug))
+
+
+@pharmacy_admin.route('/products/import', methods=['GET', 'POST'])
+@login_required
+def import_products(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    result = None
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            flash('Selecciona un archivo para importar', 'error')
+        else:
+            try:
+                result = import_product_rows(pharmacy.id, read_rows(file.stream, file.filename))
+                flash(f'Importación finalizada: {result.imported} productos importados, '
+                      f'{len(result.errors)} filas con errores.', 'success' if not result.errors else 'warning')
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Error al importar productos: {str(e)}', 'error')
+
+    return render_template('pharmacy/admin/import_products.html', pharmacy=pharmacy, result=result)
+
+
+@pharmacy_admin.route('/products/export')
+@login_required
+def export_products(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    filename = f"productos-{pharmacy.slug}-{datetime.utcnow().strftime('%Y%m%d')}"
+    if request.args.get('format') == 'xlsx':
+        path = export_products_xlsx(pharmacy.id)
+        response = send_file(path, as_attachment=True, download_name=f'{filename}.xlsx')
+        response.call_on_close(lambda: os.remove(path))
+        return response
+
+    return Response(stream_with_context(export_products_csv(pharmacy.id)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
+
+
+@pharmacy_admin.route('/reports', methods=['GET', 'POST'])
+@login_required
+def reports(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        fmt = request.form.get('format')
+        try:
+            date_from = datetime.strptime(request.form['date_from'], '%Y-%m-%d').date() if request.form.get('date_from') else None
+            date_to = datetime.strptime(request.form['date_to'], '%Y-%m-%d').date() if request.form.get('date_to') else None
+        except ValueError:
+            flash('Fechas inválidas', 'error')
+        else:
+            if kind not in REPORTS or fmt not in REPORT_FORMATS:
+                flash('Tipo de reporte inválido', 'error')
+            else:
+                request_report(pharmacy.id, kind, fmt, date_from, date_to)
+                db.session.commit()
+                flash('El reporte se está generando. Aparecerá en la lista cuando esté listo.', 'success')
+                return redirect(url_for('pharmacy_admin.reports', slug=slug))
+
+    recent_reports = (Report.query.filter_by(pharmacy_id=pharmacy.id)
+                      .options(selectinload(Report.job))
+                      .order_by(Report.created_at.desc(), Report.id.desc())
+                      .limit(20)
+                      .all())
+    return render_template('pharmacy/admin/reports.html', pharmacy=pharmacy, reports=recent_reports,
+                           report_types=REPORTS, report_formats=REPORT_FORMATS)
+
+
+@pharmacy_admin.route('/reports/<int:report_id>/download')
+@login_required
+def download_report(slug, report_id):
+    pharmacy = get_pharmacy_or_404(slug)
+    report = Report.query.filter_by(id=report_id, pharmacy_id=pharmacy.id).first_or_404()
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    if not report.file_path or not os.path.exists(report.file_path):
+        abort(404)
+
+    return send_file(report.file_path, as_attachment=True,
+                     download_name=f'{report.kind}-{pharmacy.slug}-{report.created_at:%Y%m%d}.{report.format}')
+
+
+@pharmacy_admin.route('/jobs')
+@login_required
+def jobs(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    recent_jobs = (Job.query.filter_by(pharmacy_id=pharmacy.id)
+                   .order_by(Job.created_at.desc(), Job.id.desc())
+                   .limit(50)
+                   .all())
+    return render_template('pharmacy/admin/jobs.html', pharmacy=pharmacy, jobs=recent_jobs)
+
+
+@pharmacy_admin.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_job(slug, job_id):
+    pharmacy = get_pharmacy_or_404(slug)
+    job = Job.query.filter_by(id=job_id, pharmacy_id=pharmacy.id).first_or_404()
+
+    if current_user.role != 'pharmacy_admin' or not current_user.pharmacy or current_user.pharmacy.slug != slug:
+        flash('Acceso denegado', 'error')
+        return redirect(url_for('pharmacy_admin.login', slug=slug))
+
+    if job.status == 'failed':
+        job.status = 'pending'
+        job.attempts = 0
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+        flash('Tarea reprogramada', 'success')
+
+    return redirect(url_for('pharmacy_admin.jobs', slug=slug))
@@ -0,0 +1,250 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import select, update, insert
+
+from fragment_cache import stale_catalogs
+from metrics import stale_metrics
+from models import db, Product
+
+product_table = Product.__table__
+
+COLUMNS = ('sku', 'name', 'description', 'price', 'stock_quantity', 'category', 'is_active')
+HEADER_ALIASES = {
+    'nombre': 'name',
+    'descripcion': 'description',
+    'descripción': 'description',
+    'precio': 'price',
+    'stock': 'stock_quantity',
+    'existencias': 'stock_quantity',
+    'categoria': 'category',
+    'categoría': 'category',
+    'activo': 'is_active',
+}
+TRUE_VALUES = {'1', 'true', 'si', 'sí', 'yes', 'x'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+class ImportResult:
+    """Outcome of ``import_products``: rows written and ``(row number, message)`` errors."""
+
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    @property
+    def total(self):
+        return self.imported + len(self.errors)
+
+
+def read_rows(stream, filename):
+    """Yield ``(row_number, {column: value})`` from a CSV or XLSX upload, one row at a time.
+
+    XLSX files are opened in read-only mode, so rows are parsed lazily
+    instead of loading the whole sheet.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = _header(next(rows, ()))
+            for row_number, values in enumerate(rows, start=2):
+                if any(value not in (None, '') for value in values):
+                    yield row_number, _row(header, values)
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t') if sample else csv.excel
+        rows = csv.reader(text, dialect)
+        header = _header(next(rows, ()))
+        for row_number, values in enumerate(rows, start=2):
+            if any(value.strip() for value in values):
+                yield row_number, _row(header, values)
+    else:
+        raise ValueError('Formato no soportado: use un archivo .csv o .xlsx')
+
+
+def _header(cells):
+    names = [str(cell or '').strip().lower() for cell in cells]
+    return [HEADER_ALIASES.get(name, name) for name in names]
+
+
+def _row(header, values):
+    # Short rows get every column of the header, so all rows upsert the same columns.
+    values = list(values) + [None] * (len(header) - len(values))
+    return {name: value for name, value in zip(header, values) if name}
+
+
+def validate_row(row):
+    """Return ``(values, None)`` ready to upsert, or ``(None, message)``.
+
+    ``sku``, ``name`` and ``price`` are required; the other columns are only
+    set when the file has them, so existing products keep their values.
+    """
+    sku = _text(row.get('sku'))
+    name = _text(row.get('name'))
+    if not sku:
+        return None, 'Falta el SKU'
+    if not name:
+        return None, 'Falta el nombre'
+    if len(sku) > 50 or len(name) > 100:
+        return None, 'SKU o nombre demasiado largo'
+
+    try:
+        price = Decimal(str(row.get('price')).strip().replace(',', '.'))
+    except (InvalidOperation, ValueError):
+        return None, f'Precio inválido: {row.get("price")!r}'
+    if not price.is_finite() or price < 0:
+        return None, f'Precio inválido: {row.get("price")!r}'
+
+    values = {'sku': sku, 'name': name, 'price': price.quantize(Decimal('0.01'))}
+    if 'description' in row:
+        values['description'] = _text(row['description']) or None
+    if 'category' in row:
+        values['category'] = _text(row['category'])[:50] or None
+
+    if 'stock_quantity' in row:
+        try:
+            stock = int(Decimal(_text(row['stock_quantity']) or '0'))
+        except (InvalidOperation, ValueError):
+            return None, f'Stock inválido: {row["stock_quantity"]!r}'
+        if stock < 0:
+            return None, 'El stock no puede ser negativo'
+        values['stock_quantity'] = stock
+
+    if 'is_active' in row:
+        active = _text(row['is_active']).lower()
+        if active and active not in TRUE_VALUES | FALSE_VALUES:
+            return None, f'Valor de activo inválido: {row["is_active"]!r}'
+        values['is_active'] = active not in FALSE_VALUES
+
+    return values, None
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def import_products(pharmacy_id, rows, chunk_size=500):
+    """Validate ``rows`` from ``read_rows`` and upsert them by ``(pharmacy_id, sku)``.
+
+    Valid rows are written in chunks of ``chunk_size``, one
+    ``INSERT ... ON CONFLICT DO UPDATE`` statement and commit per chunk, so
+    memory use does not grow with the file. Invalid rows are skipped and
+    reported in the returned ``ImportResult``.
+    """
+    result = ImportResult()
+    chunk = {}
+    for row_number, row in rows:
+        values, message = validate_row(row)
+        if message:
+            result.errors.append((row_number, message))
+            continue
+        # A repeated SKU within a chunk keeps its last row.
+        chunk[values['sku']] = values
+        if len(chunk) >= chunk_size:
+            result.imported += _upsert(pharmacy_id, list(chunk.values()))
+            chunk = {}
+    if chunk:
+        result.imported += _upsert(pharmacy_id, list(chunk.values()))
+    return result
+
+
+def _upsert(pharmacy_id, chunk):
+    now = datetime.utcnow()
+    rows = [dict(values, pharmacy_id=pharmacy_id, created_at=now, updated_at=now) for values in chunk]
+    updated = [column for column in rows[0] if column not in ('sku', 'pharmacy_id', 'created_at')]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        statement = upsert(product_table)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[product_table.c.pharmacy_id, product_table.c.sku],
+            set_={column: statement.excluded[column] for column in updated},
+        ), rows)
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as upsert
+        statement = upsert(product_table)
+        db.session.execute(statement.on_duplicate_key_update(
+            **{column: statement.inserted[column] for column in updated}
+        ), rows)
+    else:
+        existing = set(db.session.execute(
+            select(product_table.c.sku)
+            .where(product_table.c.pharmacy_id == pharmacy_id,
+                   product_table.c.sku.in_([row['sku'] for row in rows]))
+        ).scalars())
+        for row in rows:
+            if row['sku'] in existing:
+                db.session.execute(
+                    update(product_table)
+                    .where(product_table.c.pharmacy_id == pharmacy_id, product_table.c.sku == row['sku'])
+                    .values({column: row[column] for column in updated})
+                )
+        new_rows = [row for row in rows if row['sku'] not in existing]
+        if new_rows:
+            db.session.execute(insert(product_table), new_rows)
+
+    # Core statements bypass the mapper events that expire the stock counters
+    # and the cached storefront fragments.
+    stale_metrics.mark(db.session, ('products', pharmacy_id))
+    stale_catalogs.mark(db.session, pharmacy_id)
+    db.session.commit()
+    return len(rows)
+
+
+def export_query(pharmacy_id):
+    return (select(*(product_table.c[column] for column in COLUMNS))
+            .where(product_table.c.pharmacy_id == pharmacy_id)
+            .order_by(product_table.c.id)
+            .execution_options(yield_per=1000))
+
+
+def export_products_csv(pharmacy_id):
+    """Yield the catalog of a pharmacy as CSV text, a chunk of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for partition in db.session.execute(export_query(pharmacy_id)).partitions():
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_products_xlsx(pharmacy_id):
+    """Write the catalog of a pharmacy to a temporary XLSX file and return its path.
+
+    The workbook is built in write-only mode, so rows are flushed to disk
+    as they are fetched instead of being held in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Productos')
+    sheet.append(COLUMNS)
+    for row in db.session.execute(export_query(pharmacy_id)):
+        sheet.append(list(row))
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    workbook.save(path)
+    return path
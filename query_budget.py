@@ -0,0 +1,50 @@
+import functools
+import logging
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised instead of logging when ``QUERY_BUDGET_STRICT`` is set, so tests fail."""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_count():
+    """Number of SQL statements run so far in the current app context."""
+    return g.get('query_count', 0)
+
+
+def query_budget(limit):
+    """Declare how many queries a view may run, template rendering included.
+
+    Going over the budget logs a warning naming the endpoint and both
+    counts, or raises ``QueryBudgetExceeded`` when ``QUERY_BUDGET_STRICT``
+    is set. Place it right below ``@app.route`` so the queries of
+    ``login_required`` (loading the user) are counted too.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            start = query_count()
+            response = view(*args, **kwargs)
+            used = query_count() - start
+            if used > limit:
+                message = f'{request.endpoint} ran {used} queries, budget is {limit}'
+                if current_app.config.get('QUERY_BUDGET_STRICT'):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+
+        wrapper.query_budget = limit
+        return wrapper
+
+    return decorator
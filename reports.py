@@ -0,0 +1,232 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from jobs import job_handler, enqueue
+from models import db, Order, OrderItem, Product, Report
+
+FORMATS = ('xlsx', 'pdf')
+STREAM_BATCH = 1000
+
+
+class ReportSpec:
+    """A report: its title, column headers and a generator of row tuples."""
+
+    def __init__(self, title, columns, rows, dated=True):
+        self.title = title
+        self.columns = columns
+        self.rows = rows
+        self.dated = dated
+
+
+def _stream(statement):
+    # Server-side cursor on PostgreSQL/MySQL; rows are fetched in batches.
+    return db.session.execute(statement.execution_options(yield_per=STREAM_BATCH))
+
+
+def _date_range(statement, column, date_from, date_to):
+    if date_from:
+        statement = statement.where(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        statement = statement.where(column < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return statement
+
+
+def order_rows(pharmacy_id, date_from=None, date_to=None):
+    statement = _date_range(
+        select(Order.order_number, Order.created_at, Order.customer_name, Order.customer_email,
+               Order.status, Order.payment_status, Order.total_amount)
+        .where(Order.pharmacy_id == pharmacy_id)
+        .order_by(Order.created_at, Order.id),
+        Order.created_at, date_from, date_to)
+    total = Decimal('0')
+    for row in _stream(statement):
+        total += row.total_amount or 0
+        yield tuple(row)
+    yield ('TOTAL', None, None, None, None, None, total)
+
+
+def sales_rows(pharmacy_id, date_from=None, date_to=None):
+    revenue = func.sum(OrderItem.quantity * OrderItem.price)
+    statement = _date_range(
+        select(Product.sku, Product.name, func.sum(OrderItem.quantity), revenue)
+        .select_from(OrderItem)
+        .join(Order, Order.id == OrderItem.order_id)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(Order.pharmacy_id == pharmacy_id, Order.status != 'cancelled')
+        .group_by(Product.id, Product.sku, Product.name)
+        .order_by(revenue.desc()),
+        Order.created_at, date_from, date_to)
+    units, total = 0, Decimal('0')
+    for sku, name, quantity, amount in _stream(statement):
+        units += quantity or 0
+        total += amount or 0
+        yield (sku, name, quantity, amount)
+    yield ('TOTAL', None, units, total)
+
+
+def inventory_rows(pharmacy_id, date_from=None, date_to=None):
+    statement = (select(Product.sku, Product.name, Product.category, Product.stock_quantity, Product.price,
+                        Product.stock_quantity * Product.price)
+                 .where(Product.pharmacy_id == pharmacy_id)
+                 .order_by(Product.name, Product.id))
+    units, total = 0, Decimal('0')
+    for row in _stream(statement):
+        units += row[3] or 0
+        total += row[5] or 0
+        yield tuple(row)
+    yield ('TOTAL', None, None, units, None, total)
+
+
+REPORTS = {
+    'sales': ReportSpec('Ventas por producto', ('SKU', 'Producto', 'Unidades', 'Ingresos'), sales_rows),
+    'orders': ReportSpec('Pedidos', ('Número', 'Fecha', 'Cliente', 'Email', 'Estado', 'Pago', 'Total'), order_rows),
+    'inventory': ReportSpec('Valorización de inventario',
+                            ('SKU', 'Producto', 'Categoría', 'Stock', 'Precio', 'Valor'),
+                            inventory_rows, dated=False),
+}
+
+
+def request_report(pharmacy_id, kind, fmt, date_from=None, date_to=None):
+    """Record a report and queue its generation; the caller commits."""
+    report = Report(pharmacy_id=pharmacy_id, kind=kind, format=fmt, date_from=date_from, date_to=date_to)
+    db.session.add(report)
+    db.session.flush()
+    report.job = enqueue('generate_report', pharmacy_id=pharmacy_id, report_id=report.id)
+    return report
+
+
+@job_handler('generate_report')
+def generate_report(report_id):
+    """Job: write a report file row by row and record where it is."""
+    report = db.session.get(Report, report_id)
+    if report is None:
+        return
+    spec = REPORTS[report.kind]
+    folder = os.path.abspath(current_app.config['REPORT_FOLDER'])
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{report.kind}-{report.id}-{uuid.uuid4().hex[:8]}.{report.format}')
+
+    subtitle = report_subtitle(report)
+    rows = spec.rows(report.pharmacy_id, report.date_from, report.date_to)
+    tmp_path = f'{path}.tmp'
+    try:
+        writer = write_xlsx if report.format == 'xlsx' else write_pdf
+        row_count = writer(tmp_path, spec.title, subtitle, spec.columns, rows)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    report.file_path = path
+    report.row_count = row_count
+    report.completed_at = datetime.utcnow()
+    db.session.commit()
+
+
+def report_subtitle(report):
+    if not REPORTS[report.kind].dated:
+        return f'Al {datetime.utcnow():%d/%m/%Y}'
+    date_from = f'{report.date_from:%d/%m/%Y}' if report.date_from else 'el inicio'
+    date_to = f'{report.date_to:%d/%m/%Y}' if report.date_to else 'hoy'
+    return f'Desde {date_from} hasta {date_to}'
+
+
+def write_xlsx(path, title, subtitle, columns, rows):
+    """Write ``rows`` with a write-only workbook, which keeps memory flat; returns the row count."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append([title])
+    sheet.append([subtitle])
+    sheet.append(list(columns))
+    count = 0
+    for row in rows:
+        sheet.append(list(row))
+        count += 1
+    with open(path, 'wb') as f:
+        workbook.save(f)
+    return count
+
+
+def write_pdf(path, title, subtitle, columns, rows):
+    """Draw ``rows`` as a paged table directly on a canvas; returns the row count.
+
+    Each row is drawn as it arrives instead of building a platypus table,
+    so only the compressed page streams are kept until the file is saved.
+    """
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+
+    width, height = landscape(A4)
+    margin, line = 36, 14
+    column_width = (width - 2 * margin) / len(columns)
+    pdf = canvas.Canvas(path, pagesize=(width, height), pageCompression=1)
+    pdf.setTitle(title)
+
+    def cell(value, font, size):
+        if value is None:
+            return ''
+        if isinstance(value, Decimal):
+            text = f'{value:,.2f}'
+        elif isinstance(value, datetime):
+            text = f'{value:%d/%m/%Y %H:%M}'
+        else:
+            text = str(value)
+        while text and stringWidth(text, font, size) > column_width - 4:
+            text = text[:-1]
+        return text
+
+    def start_page(page):
+        pdf.setFont('Helvetica-Bold', 14)
+        pdf.drawString(margin, height - margin, title)
+        pdf.setFont('Helvetica', 9)
+        pdf.drawString(margin, height - margin - 16, subtitle)
+        pdf.drawRightString(width - margin, height - margin - 16, f'Página {page}')
+        y = height - margin - 40
+        pdf.setFont('Helvetica-Bold', 9)
+        for index, column in enumerate(columns):
+            pdf.drawString(margin + index * column_width, y, cell(column, 'Helvetica-Bold', 9))
+        pdf.line(margin, y - 4, width - margin, y - 4)
+        return y - line
+
+    # One text object per page: far cheaper than a drawString call per cell.
+    page = 1
+    y = start_page(page)
+    text = pdf.beginText()
+    text.setFont('Helvetica', 8)
+    count = 0
+    for row in rows:
+        if y < margin:
+            pdf.drawText(text)
+            pdf.showPage()
+            page += 1
+            y = start_page(page)
+            text = pdf.beginText()
+            text.setFont('Helvetica', 8)
+        for index, value in enumerate(row):
+            text.setTextOrigin(margin + index * column_width, y)
+            text.textOut(cell(value, 'Helvetica', 8))
+        y -= line
+        count += 1
+    pdf.drawText(text)
+    pdf.save()
+    return count
+
+
+def prune_reports(retention_days=7):
+    """Delete report files and records older than the retention window; returns how many."""
+    horizon = datetime.utcnow() - timedelta(days=retention_days)
+    reports = Report.query.filter(Report.created_at < horizon).all()
+    for report in reports:
+        if report.file_path and os.path.exists(report.file_path):
+            os.remove(report.file_path)
+        db.session.delete(report)
+    db.session.commit()
+    return len(reports)
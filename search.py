@@ -0,0 +1,123 @@
+import re
+
+from sqlalchemy import cast, event, inspect, literal_column, select, table, column, text, func, or_
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+
+from models import db, Product
+
+# Document indexed for every product. The PostgreSQL expression index and the
+# query below must use this exact expression for the planner to match them;
+# migration 3f1c2a9b7d41 keeps a frozen copy of it.
+SEARCH_DOCUMENT_SQL = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' "
+    "|| coalesce(category, '') || ' ' || coalesce(sku, ''))"
+)
+
+POSTGRES_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_product_search_document ON product USING gin ({SEARCH_DOCUMENT_SQL})",
+    "CREATE INDEX IF NOT EXISTS ix_product_name_trgm ON product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_product_sku_trgm ON product USING gin (sku gin_trgm_ops)",
+]
+
+SQLITE_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "name, description, category, sku, content='product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, name, description, category, sku) "
+    "VALUES (new.id, new.name, new.description, new.category, new.sku); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, description, category, sku) "
+    "VALUES ('delete', old.id, old.name, old.description, old.category, old.sku); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, description, category, sku) "
+    "VALUES ('delete', old.id, old.name, old.description, old.category, old.sku); "
+    "INSERT INTO product_fts(rowid, name, description, category, sku) "
+    "VALUES (new.id, new.name, new.description, new.category, new.sku); END",
+]
+
+product_fts = table('product_fts', column('rowid'), column('rank'))
+
+_fts_available = {}
+
+
+def search_terms(search_query):
+    """Split a raw query into word tokens safe to embed in a full-text query."""
+    return re.findall(r'\w+', search_query.lower())
+
+
+def search_products(query, search_query):
+    """Restrict ``query`` to products matching ``search_query``.
+
+    Returns ``(query, rank)`` where ``rank`` is an expression that sorts the
+    best matches first in ascending order, or ``None`` when the database has
+    no full-text index and the query falls back to a substring match. Every
+    term is matched as a prefix, so results update as the user types.
+    """
+    terms = search_terms(search_query)
+    if not terms:
+        return query, None
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return _search_postgresql(query, search_query, terms)
+    if dialect == 'sqlite' and _has_sqlite_fts():
+        return _search_sqlite(query, terms)
+
+    return query.filter(Product.name.ilike(f'%{search_query}%')), None
+
+
+def _search_postgresql(query, search_query, terms):
+    document = literal_column(SEARCH_DOCUMENT_SQL)
+    ts_query = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+    query = query.filter(or_(document.op('@@')(ts_query),
+                             Product.name.ilike(f'%{search_query}%'),
+                             Product.sku.ilike(f'%{search_query}%')))
+    # Both functions return ``real``; as ``double precision`` the rank read
+    # back into a cursor compares equal to the stored value on the next page.
+    rank = cast(-(func.ts_rank_cd(document, ts_query) + func.similarity(Product.name, search_query)),
+                DOUBLE_PRECISION)
+    return query, rank
+
+
+def _search_sqlite(query, terms):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    ranked = (select(product_fts.c.rowid.label('product_id'), product_fts.c.rank.label('rank'))
+              .where(literal_column('product_fts').op('MATCH')(match))
+              .subquery())
+    query = query.join(ranked, ranked.c.product_id == Product.id)
+    return query, ranked.c.rank
+
+
+def _has_sqlite_fts():
+    key = str(db.engine.url)
+    if key not in _fts_available:
+        _fts_available[key] = inspect(db.engine).has_table('product_fts')
+    return _fts_available[key]
+
+
+def create_search_index(connection):
+    """Create the full-text index objects for the connection's dialect."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statements = POSTGRES_INDEX_DDL
+    elif dialect == 'sqlite':
+        statements = SQLITE_INDEX_DDL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+    _fts_available.pop(str(connection.engine.url), None)
+
+
+def rebuild_search_index(connection):
+    """Create the index if needed and repopulate it from the product table."""
+    create_search_index(connection)
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
@@ -0,0 +1,188 @@
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, session, url_for
+
+from cart import resolve_cart
+from cart_store import cart_store, new_cart_id
+from catalog import InvalidCursor, category_counts, filter_products, paginate_products
+from checkout import find_order, generate_idempotency_key, place_order
+from fragment_cache import fragment_cache
+from inventory import OutOfStock
+from models import Category, Order, Product
+from search import search_products
+from tenant_cache import get_pharmacy_or_404
+
+storefront = Blueprint('storefront', __name__, url_prefix='/pharmacy/<slug>')
+
+
+def get_cart_id():
+    """Id of the visitor's server-side cart, assigning one on first use."""
+    if 'cart_id' not in session:
+        session['cart_id'] = new_cart_id()
+    return session['cart_id']
+
+
+def get_cart_items(pharmacy):
+    """Resolve the visitor's cart for ``pharmacy``; see ``cart.resolve_cart``."""
+    return resolve_cart(pharmacy, cart_store.get(session.get('cart_id'), pharmacy.id))
+
+
+@storefront.route('')
+def home(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    def render_featured():
+        products = (Product.query.filter_by(pharmacy_id=pharmacy.id, is_active=True)
+                    .order_by(Product.name, Product.id)
+                    .limit(7)
+                    .all())
+        return render_template('pharmacy/fragments/featured_products.html', pharmacy=pharmacy,
+                               products=products, categories=category_counts(pharmacy.id))
+
+    featured_products = fragment_cache.fragment(pharmacy.id, 'home', [], render_featured)
+    return render_template('pharmacy/home.html', pharmacy=pharmacy, featured_products=featured_products)
+
+
+@storefront.route('/products')
+def products(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    search_query = request.args.get('search', '').strip()
+    category_filter = request.args.get('category', '').strip()
+    max_price = request.args.get('max_price', '').strip()
+
+    after = request.args.get('after')
+    before = request.args.get('before')
+
+    def render_grid():
+        query = Product.query.filter_by(pharmacy_id=pharmacy.id, is_active=True)
+
+        rank = None
+        if search_query:
+            query, rank = search_products(query, search_query)
+
+        query = filter_products(query, category=category_filter, max_price=max_price)
+
+        try:
+            page = paginate_products(query,
+                                     per_page=current_app.config['POSTS_PER_PAGE'],
+                                     after=after,
+                                     before=before,
+                                     rank=rank)
+        except InvalidCursor:
+            abort(400)
+        return render_template('pharmacy/fragments/product_grid.html',
+                               pharmacy=pharmacy,
+                               products=page.items,
+                               page=page,
+                               search_query=search_query,
+                               category_filter=category_filter,
+                               max_price=max_price)
+
+    product_grid = fragment_cache.fragment(pharmacy.id, 'products',
+                                           [search_query, category_filter, max_price, after, before],
+                                           render_grid)
+    categories = [category.name for category in Category.query.filter_by(is_active=True).order_by(Category.name)]
+
+    return render_template('pharmacy/products.html',
+                         pharmacy=pharmacy,
+                         product_grid=product_grid,
+                         categories=categories,
+                         search_query=search_query,
+                         category_filter=category_filter,
+                         max_price=max_price)
+
+
+@storefront.route('/product/<int:product_id>')
+def product_detail(slug, product_id):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    def render_card():
+        product = Product.query.filter_by(id=product_id, pharmacy_id=pharmacy.id, is_active=True).first_or_404()
+        return render_template('pharmacy/fragments/product_detail.html', pharmacy=pharmacy, product=product)
+
+    product_card = fragment_cache.fragment(pharmacy.id, 'product', [product_id], render_card)
+    return render_template('pharmacy/product_detail.html', pharmacy=pharmacy, product_card=product_card)
+
+
+@storefront.route('/cart')
+def cart(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    cart_items, total = get_cart_items(pharmacy)
+
+    return render_template('pharmacy/cart.html', pharmacy=pharmacy, cart_items=cart_items, total=total)
+
+
+@storefront.route('/add_to_cart', methods=['POST'])
+def add_to_cart(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+    data = request.get_json()
+    product_id = data.get('product_id')
+    quantity = data.get('quantity', 1)
+
+    product = Product.query.filter_by(id=product_id, pharmacy_id=pharmacy.id, is_active=True).first()
+    if not product:
+        return jsonify({'success': False, 'error': 'Producto no encontrado'})
+
+    if not isinstance(quantity, int) or quantity < 1:
+        return jsonify({'success': False, 'error': 'Cantidad inválida'})
+
+    cart_count = cart_store.add(get_cart_id(), pharmacy.id, product.id, quantity)
+    return jsonify({'success': True, 'cart_count': cart_count})
+
+
+@storefront.route('/update_cart', methods=['POST'])
+def update_cart(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+    data = request.get_json()
+    product_id = data.get('product_id')
+    quantity = data.get('quantity', 0)
+
+    if not isinstance(product_id, int) or not isinstance(quantity, int) or quantity < 0:
+        return jsonify({'success': False, 'error': 'Cantidad inválida'})
+
+    if quantity and not Product.query.filter_by(id=product_id, pharmacy_id=pharmacy.id, is_active=True).first():
+        return jsonify({'success': False, 'error': 'Producto no encontrado'})
+
+    cart_count = cart_store.set(get_cart_id(), pharmacy.id, product_id, quantity)
+    return jsonify({'success': True, 'cart_count': cart_count})
+
+
+@storefront.route('/checkout', methods=['GET', 'POST'])
+def checkout(slug):
+    pharmacy = get_pharmacy_or_404(slug)
+
+    if request.method == 'POST':
+        idempotency_key = request.form.get('idempotency_key')
+        # A resubmitted form lands on the order it already created.
+        order = find_order(pharmacy, idempotency_key) if idempotency_key else None
+        if order is not None:
+            return redirect(url_for('storefront.order_confirmation', slug=slug, order_id=order.id))
+
+        cart_items, _ = get_cart_items(pharmacy)
+        if not cart_items:
+            flash('El carrito está vacío', 'error')
+            return redirect(url_for('storefront.cart', slug=slug))
+
+        try:
+            order, created = place_order(pharmacy, request.form, cart_items, idempotency_key)
+        except OutOfStock as e:
+            flash(str(e), 'error')
+            return redirect(url_for('storefront.cart', slug=slug))
+
+        cart_store.clear(session.get('cart_id'), pharmacy.id)
+        if created:
+            flash('Pedido realizado exitosamente!', 'success')
+        return redirect(url_for('storefront.order_confirmation', slug=slug, order_id=order.id))
+
+    cart_items, total = get_cart_items(pharmacy)
+
+    return render_template('pharmacy/checkout.html', pharmacy=pharmacy, cart_items=cart_items, total=total,
+                           idempotency_key=generate_idempotency_key())
+
+
+@storefront.route('/order/<int:order_id>/confirmation')
+def order_confirmation(slug, order_id):
+    pharmacy = get_pharmacy_or_404(slug)
+    order = Order.query.filter_by(id=order_id, pharmacy_id=pharmacy.id).first_or_404()
+
+    return render_template('pharmacy/order_confirmation.html', pharmacy=pharmacy, order=order)
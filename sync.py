@@ -0,0 +1,154 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, insert, tuple_
+
+from models import db, Product, ProductTombstone
+
+tombstone_table = ProductTombstone.__table__
+
+
+class SyncCursor:
+    """Position of a client in a pharmacy's change stream.
+
+    ``updated_at``/``product_id`` is the last product change delivered,
+    ``tombstone_id`` the last deletion and ``issued_at`` when the cursor was
+    handed out, used to detect clients that have not synced within the
+    tombstone retention window. ``round_started`` is when the client's
+    current sync round began, a round being the pages fetched up to one
+    without ``has_more``; ``in_round`` is true while more pages follow.
+    """
+
+    def __init__(self, updated_at=None, product_id=0, tombstone_id=0, issued_at=None, round_started=None,
+                 in_round=False):
+        self.updated_at = updated_at
+        self.product_id = product_id
+        self.tombstone_id = tombstone_id
+        self.issued_at = issued_at or datetime.utcnow()
+        self.round_started = round_started or self.issued_at
+        self.in_round = in_round
+
+    def encode(self):
+        raw = json.dumps({
+            'u': self.updated_at.isoformat() if self.updated_at else None,
+            'p': self.product_id,
+            't': self.tombstone_id,
+            's': self.issued_at.isoformat(),
+            'r': self.round_started.isoformat(),
+            'm': self.in_round,
+        }, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @classmethod
+    def decode(cls, cursor):
+        """Return a ``SyncCursor`` or ``None`` if ``cursor`` is invalid."""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            return cls(updated_at=datetime.fromisoformat(data['u']) if data['u'] else None,
+                       product_id=int(data['p']),
+                       tombstone_id=int(data['t']),
+                       issued_at=datetime.fromisoformat(data['s']),
+                       round_started=datetime.fromisoformat(data['r']) if data.get('r') else None,
+                       in_round=data.get('m') is True)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+
+
+def catalog_changes(pharmacy_id, cursor=None, limit=500, retention_days=90, overlap_seconds=60):
+    """Return the catalog changes of a pharmacy after ``cursor``.
+
+    The result holds ``products`` created or updated since the cursor
+    (deactivated ones included, with ``is_active`` false), the ids of
+    products ``deleted`` since the cursor, the ``next_cursor`` and
+    ``has_more``. Without a cursor the stream starts from the whole
+    catalog. ``reset`` is true when the cursor was invalid or older than the
+    tombstone retention, in which case the client must drop its local copy
+    and resync from scratch.
+
+    ``updated_at`` and tombstone ids are assigned before their transaction
+    commits, so a change can become visible behind a cursor that already
+    passed it. The first page of each round therefore also repeats the
+    changes stamped from ``overlap_seconds`` before the previous round
+    began up to the cursor; ``overlap_seconds`` must exceed the longest
+    transaction that writes products. Clients apply changes by id, so a
+    repeated product or deletion is harmless.
+    """
+    state = SyncCursor.decode(cursor) if cursor else None
+    horizon = datetime.utcnow() - timedelta(days=retention_days)
+    reset = cursor is not None and (state is None or state.issued_at < horizon)
+
+    if state is None or reset:
+        # A full sync already reflects every past deletion.
+        last_tombstone = (db.session.query(func.max(ProductTombstone.id))
+                          .filter(ProductTombstone.pharmacy_id == pharmacy_id)
+                          .scalar())
+        state = SyncCursor(tombstone_id=last_tombstone or 0)
+        window_start = None
+    elif state.in_round:
+        window_start = None
+    else:
+        window_start = state.round_started - timedelta(seconds=overlap_seconds)
+    round_started = state.round_started if state.in_round else datetime.utcnow()
+
+    query = Product.query.filter(Product.pharmacy_id == pharmacy_id)
+    if state.updated_at is not None:
+        query = query.filter(tuple_(Product.updated_at, Product.id) > (state.updated_at, state.product_id))
+    products = query.order_by(Product.updated_at, Product.id).limit(limit + 1).all()
+
+    tombstones = (db.session.query(ProductTombstone.id, ProductTombstone.product_id)
+                  .filter(ProductTombstone.pharmacy_id == pharmacy_id,
+                          ProductTombstone.id > state.tombstone_id)
+                  .order_by(ProductTombstone.id)
+                  .limit(limit + 1)
+                  .all())
+
+    has_more = len(products) > limit or len(tombstones) > limit
+    products = products[:limit]
+    tombstones = tombstones[:limit]
+
+    resent_products = []
+    resent_deleted = []
+    if window_start is not None:
+        if state.updated_at is not None:
+            resent_products = (Product.query
+                               .filter(Product.pharmacy_id == pharmacy_id,
+                                       Product.updated_at >= window_start,
+                                       tuple_(Product.updated_at, Product.id) <= (state.updated_at, state.product_id))
+                               .order_by(Product.updated_at, Product.id)
+                               .all())
+        resent_deleted = [tombstone.product_id for tombstone in
+                          db.session.query(ProductTombstone.product_id)
+                          .filter(ProductTombstone.pharmacy_id == pharmacy_id,
+                                  ProductTombstone.id <= state.tombstone_id,
+                                  ProductTombstone.deleted_at >= window_start)
+                          .order_by(ProductTombstone.id)]
+
+    next_cursor = SyncCursor(updated_at=products[-1].updated_at if products else state.updated_at,
+                             product_id=products[-1].id if products else state.product_id,
+                             tombstone_id=tombstones[-1].id if tombstones else state.tombstone_id,
+                             round_started=round_started,
+                             in_round=has_more)
+    deleted = resent_deleted + [tombstone.product_id for tombstone in tombstones]
+    return {
+        'products': resent_products + products,
+        'deleted': list(dict.fromkeys(deleted)),
+        'next_cursor': next_cursor.encode(),
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+def prune_tombstones(retention_days=90):
+    """Delete tombstones older than the retention window; returns how many."""
+    horizon = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = ProductTombstone.query.filter(ProductTombstone.deleted_at < horizon).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, product):
+    connection.execute(insert(tombstone_table).values(product_id=product.id,
+                                                      pharmacy_id=product.pharmacy_id,
+                                                      deleted_at=datetime.utcnow()))
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from flask import abort, g, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from cache_invalidation import CommitInvalidation
+from models import db, Pharmacy
+
+
+class TenantCache:
+    """Per-process slug -> active pharmacy cache.
+
+    Entries are column snapshots rather than ORM instances, so a cached
+    pharmacy never carries expired state from another request's session.
+    Reads re-attach the snapshot to the current session with
+    ``merge(load=False)``, which costs no query.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('TENANT_CACHE_TTL', self.ttl)
+        app.extensions['tenant_cache'] = self
+
+    def get(self, slug):
+        """Return the active pharmacy for ``slug`` or ``None``."""
+        with self._lock:
+            entry = self._entries.get(slug)
+
+        if entry is not None and entry[0] > time.monotonic():
+            return self._attach(entry[1])
+
+        pharmacy = Pharmacy.query.filter_by(slug=slug, is_active=True).first()
+        if pharmacy is None:
+            self.invalidate(slug)
+            return None
+
+        with self._lock:
+            self._entries[slug] = (time.monotonic() + self.ttl, _snapshot(pharmacy))
+        return pharmacy
+
+    def invalidate(self, *slugs):
+        with self._lock:
+            for slug in slugs:
+                self._entries.pop(slug, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _attach(values):
+        pharmacy = Pharmacy(**values)
+        make_transient_to_detached(pharmacy)
+        return db.session.merge(pharmacy, load=False)
+
+
+def _snapshot(pharmacy):
+    return {attr.key: getattr(pharmacy, attr.key) for attr in inspect(Pharmacy).column_attrs}
+
+
+tenant_cache = TenantCache()
+
+
+def resolve_tenant():
+    """``before_request`` hook: the pharmacy addressed by host or path, on ``g``."""
+    g.current_pharmacy = None
+    g.current_pharmacy_slug = None
+
+    if request.host.startswith('pharmacy-'):
+        pharmacy_slug = request.host.split('.')[0].replace('pharmacy-', '')
+        g.current_pharmacy_slug = pharmacy_slug
+        g.current_pharmacy = tenant_cache.get(pharmacy_slug)
+    elif request.path.startswith('/pharmacy/'):
+        pharmacy_slug = request.path.split('/')[2]
+        g.current_pharmacy_slug = pharmacy_slug
+        g.current_pharmacy = tenant_cache.get(pharmacy_slug)
+
+
+def get_pharmacy_or_404(slug):
+    """Return the active pharmacy for ``slug``, reusing the one resolved in before_request."""
+    if g.get('current_pharmacy_slug') == slug:
+        pharmacy = g.current_pharmacy
+    else:
+        pharmacy = tenant_cache.get(slug)
+    if pharmacy is None:
+        abort(404)
+    return pharmacy
+
+
+# Any committed change to a pharmacy (toggle, edit, delete) drops its slug,
+# including the previous slug when it was renamed.
+stale_tenants = CommitInvalidation('tenants', tenant_cache.invalidate)
+
+
+def _mark_stale(mapper, connection, target):
+    history = inspect(target).attrs.slug.history
+    stale_tenants.mark_for(target, target.slug, *(slug for slug in (history.deleted or ()) if slug))
+
+
+event.listen(Pharmacy, 'after_update', _mark_stale)
+event.listen(Pharmacy, 'after_delete', _mark_stale)
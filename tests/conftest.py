@@ -0,0 +1,53 @@
+import pytest
+
+from app import create_app
+from config import Config
+from fragment_cache import fragment_cache
+from metrics import metrics_cache
+from models import db, Pharmacy, Product, User
+from tenant_cache import tenant_cache
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh file-backed SQLite database, so several threads can share it."""
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        STAGING_FOLDER = str(tmp_path / 'incoming')
+        REPORT_FOLDER = str(tmp_path / 'reports')
+        JINJA_BYTECODE_CACHE = False
+        AUDIT_ENABLED = False
+        LOGIN_THROTTLE_ENABLED = False
+        QUERY_BUDGET_STRICT = True
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    # The caches are per process and outlive each test's database.
+    for cache in (tenant_cache, metrics_cache, fragment_cache):
+        cache.clear()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def pharmacy(app):
+    """Pharmacy ``central`` with 60 products of stock 100; returns its id."""
+    with app.app_context():
+        admin = User(name='Admin', email='admin@central.test', role='pharmacy_admin')
+        admin.set_password('secret')
+        db.session.add(admin)
+        db.session.flush()
+        pharmacy = Pharmacy(name='Central', slug='central', address='Av. Principal 1', admin_user_id=admin.id)
+        db.session.add(pharmacy)
+        db.session.flush()
+        db.session.add_all([Product(name=f'Producto {number:03d}', description='Caja de 20 tabletas',
+                                    price=1 + number, stock_quantity=100, category='A' if number % 3 else 'B',
+                                    sku=f'SKU{number}', pharmacy_id=pharmacy.id)
+                            for number in range(60)])
+        db.session.commit()
+        return pharmacy.id
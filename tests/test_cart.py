@@ -0,0 +1,56 @@
+from flask import g
+
+from cart import resolve_cart
+from cart_store import cart_store
+from models import db, Pharmacy, Product
+from query_budget import query_count
+from tenant_cache import tenant_cache
+
+
+def fill_cart(app, pharmacy, lines):
+    with app.app_context():
+        product_ids = [product_id for product_id, in db.session.query(Product.id)
+                       .filter_by(pharmacy_id=pharmacy).order_by(Product.id).limit(lines)]
+        for product_id in product_ids:
+            cart_store.set('test-cart', pharmacy, product_id, 2)
+    return product_ids
+
+
+def test_resolve_cart_uses_one_query(app, pharmacy):
+    fill_cart(app, pharmacy, 50)
+    with app.app_context():
+        store = db.session.get(Pharmacy, pharmacy)
+        cart = cart_store.get('test-cart', pharmacy)
+        assert len(cart) == 50
+
+        g.query_count = 0
+        cart_items, total = resolve_cart(store, cart)
+
+        assert query_count() == 1
+        assert len(cart_items) == 50
+        assert total == sum(item['product'].price * 2 for item in cart_items)
+
+
+def cart_page_queries(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['cart_id'] = 'test-cart'
+    # Both measurements start with the pharmacy lookup uncached.
+    tenant_cache.clear()
+    # Requests reuse the pushed app context, so its counter spans the whole view.
+    with app.app_context():
+        g.query_count = 0
+        response = client.get('/pharmacy/central/cart')
+        assert response.status_code == 200
+        return query_count()
+
+
+def test_cart_page_query_count_does_not_grow_with_lines(app, pharmacy):
+    fill_cart(app, pharmacy, 1)
+    one_line = cart_page_queries(app)
+
+    fill_cart(app, pharmacy, 50)
+    fifty_lines = cart_page_queries(app)
+
+    # Pharmacy lookup, cart lines, cart products.
+    assert one_line == fifty_lines == 3
@@ -0,0 +1,66 @@
+import threading
+
+from sqlalchemy import func
+
+from models import db, InventoryMovement, Order, OrderItem, Product
+
+THREADS = 16
+STOCK = 20
+QUANTITY = 3
+
+
+def test_parallel_checkouts_never_oversell(app, pharmacy):
+    with app.app_context():
+        limited = Product.query.filter_by(pharmacy_id=pharmacy, sku='SKU0').one()
+        plenty = Product.query.filter_by(pharmacy_id=pharmacy, sku='SKU1').one()
+        limited.stock_quantity = STOCK
+        plenty.stock_quantity = 1000
+        db.session.commit()
+        limited_id, plenty_id = limited.id, plenty.id
+
+    start = threading.Barrier(THREADS)
+    statuses = []
+    errors = []
+
+    def checkout():
+        try:
+            client = app.test_client()
+            start.wait()
+            response = client.post('/api/v1/pharmacies/central/orders', json={
+                'items': [{'product_id': limited_id, 'quantity': QUANTITY},
+                          {'product_id': plenty_id, 'quantity': 1}],
+                'customer_name': 'Cliente',
+                'customer_email': 'cliente@example.com',
+                'customer_address': 'Calle 1',
+            })
+            statuses.append(response.status_code)
+        except Exception as e:  # surfaced below; a thread's exception would otherwise be lost
+            errors.append(e)
+
+    threads = [threading.Thread(target=checkout) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert set(statuses) <= {201, 409}
+    placed = statuses.count(201)
+    assert placed == STOCK // QUANTITY
+
+    with app.app_context():
+        limited = db.session.get(Product, limited_id)
+        plenty = db.session.get(Product, plenty_id)
+        assert limited.stock_quantity >= 0
+        # No lost updates: every placed order took its quantity, and nothing else did.
+        assert limited.stock_quantity == STOCK - placed * QUANTITY
+        assert plenty.stock_quantity == 1000 - placed
+        assert Order.query.count() == placed
+        assert (db.session.query(func.sum(OrderItem.quantity))
+                .filter(OrderItem.product_id == limited_id).scalar()) == placed * QUANTITY
+
+        movements = (InventoryMovement.query.filter_by(product_id=limited_id)
+                     .order_by(InventoryMovement.id).all())
+        assert len(movements) == placed
+        assert all(movement.previous_stock - movement.new_stock == QUANTITY for movement in movements)
+        assert movements[-1].new_stock == limited.stock_quantity
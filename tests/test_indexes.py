@@ -0,0 +1,61 @@
+import pytest
+
+from catalog import filter_products
+from models import db, AuditLog, InventoryMovement, Order, OrderItem, Product
+
+
+def query_plan(query):
+    """The SQLite ``EXPLAIN QUERY PLAN`` of an ORM query, as one string."""
+    sql = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    return '\n'.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+
+
+@pytest.fixture
+def db_session(app, pharmacy):
+    with app.app_context():
+        yield db.session
+
+
+def test_catalog_filters_use_the_composite_index(db_session, pharmacy):
+    query = filter_products(Product.query.filter_by(pharmacy_id=pharmacy, is_active=True),
+                            category='A', max_price='30')
+    assert 'ix_product_pharmacy_active_category_price' in query_plan(query)
+
+
+def test_catalog_listing_uses_the_name_index(db_session, pharmacy):
+    query = (Product.query.filter_by(pharmacy_id=pharmacy, is_active=True)
+             .order_by(Product.name, Product.id)
+             .limit(21))
+    plan = query_plan(query)
+    assert 'ix_product_pharmacy_name' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_recent_orders_use_the_created_at_index(db_session, pharmacy):
+    query = (Order.query.filter_by(pharmacy_id=pharmacy)
+             .order_by(Order.created_at.desc())
+             .limit(5))
+    plan = query_plan(query)
+    assert 'ix_order_pharmacy_created_at' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_orders_by_status_use_the_status_index(db_session, pharmacy):
+    query = Order.query.filter_by(pharmacy_id=pharmacy, status='pending')
+    assert 'ix_order_pharmacy_status' in query_plan(query)
+
+
+def test_order_items_use_the_order_index(db_session):
+    query = OrderItem.query.filter(OrderItem.order_id.in_([1, 2, 3]))
+    assert 'ix_order_item_order_id' in query_plan(query)
+
+
+def test_inventory_movements_use_the_product_index(db_session):
+    query = (InventoryMovement.query.filter_by(product_id=1)
+             .order_by(InventoryMovement.created_at.desc()))
+    assert 'ix_inventory_movement_product_created_at' in query_plan(query)
+
+
+def test_audit_log_lookup_uses_the_record_index(db_session):
+    query = AuditLog.query.filter_by(table_name='product', record_id=1)
+    assert 'ix_audit_log_table_record' in query_plan(query)
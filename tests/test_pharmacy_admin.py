@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import db, Order, OrderItem
+
+
+def login(client):
+    response = client.post('/pharmacy/central/admin/login',
+                           data={'email': 'admin@central.test', 'password': 'secret'})
+    assert response.status_code == 302
+
+
+def test_orders_pager_counts_orders_written_without_the_orm(app, pharmacy):
+    # Core inserts skip the mapper events, so pharmacy_order_stats never hears of them.
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(insert(Order.__table__), [
+            {'order_number': f'ORD-{number:04d}', 'customer_name': 'Cliente', 'customer_email': 'c@example.com',
+             'customer_address': 'Calle 1', 'total_amount': 10, 'status': 'pending', 'payment_status': 'pending',
+             'pharmacy_id': pharmacy, 'created_at': now - timedelta(minutes=number)}
+            for number in range(45)
+        ])
+        db.session.execute(insert(OrderItem.__table__), {'order_id': 1, 'product_id': 1, 'quantity': 1, 'price': 10})
+        db.session.commit()
+
+    client = app.test_client()
+    login(client)
+    response = client.get('/pharmacy/central/admin/orders')
+
+    assert response.status_code == 200
+    assert '1 / 3' in response.get_data(as_text=True)
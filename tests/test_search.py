@@ -0,0 +1,13 @@
+import importlib.util
+from pathlib import Path
+
+import search
+
+MIGRATION = Path(__file__).parent.parent / 'migrations' / 'versions' / '3f1c2a9b7d41_product_search_index.py'
+
+
+def test_migration_indexes_the_document_search_queries():
+    spec = importlib.util.spec_from_file_location('product_search_index', MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    assert migration.SEARCH_DOCUMENT_SQL == search.SEARCH_DOCUMENT_SQL